@@ -1,11 +1,17 @@
 import asyncio
 import logging
-from typing import Awaitable, Callable, Dict, List, Optional
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
 
 from aiogram.utils.exceptions import BotKicked, ChatNotFound, Unauthorized
 
+from .rate_limit import RateLimiter
 from .storage import Storage
 
+# Telegram allows roughly 30 outgoing messages per second per bot.
+SEND_CONCURRENCY = 30
+SEND_RATE_PER_SECOND = 30
+REFRESH_DEBOUNCE_SECONDS = 0.2
+
 
 class AutoSender:
     def __init__(
@@ -13,6 +19,8 @@ class AutoSender:
         send_message: Callable[[int, str], Awaitable[None]],
         storage: Storage,
         payment_valid_days: int,
+        *,
+        rate_limiter: Optional[RateLimiter] = None,
     ) -> None:
         self._send_message = send_message
         self._storage = storage
@@ -21,6 +29,10 @@ class AutoSender:
         self._lock = asyncio.Lock()
         self._tasks: Dict[int, asyncio.Task[None]] = {}
         self._stop_events: Dict[int, asyncio.Event] = {}
+        self._send_semaphore = asyncio.Semaphore(SEND_CONCURRENCY)
+        self._rate_limiter = rate_limiter or RateLimiter(SEND_RATE_PER_SECOND, 1.0)
+        self._refresh_generations: Dict[int, int] = {}
+        self._refresh_tasks: Dict[int, asyncio.Task[None]] = {}
 
     async def start_if_enabled(self) -> None:
         campaigns = await self._storage.list_active_campaigns()
@@ -41,6 +53,10 @@ class AutoSender:
             )
 
     async def stop(self, owner_id: Optional[int] = None) -> None:
+        if owner_id is None:
+            for refresh_task in list(self._refresh_tasks.values()):
+                refresh_task.cancel()
+            self._refresh_tasks.clear()
         async with self._lock:
             if owner_id is None:
                 targets = list(self._tasks.items())
@@ -65,6 +81,29 @@ class AutoSender:
             return
         await self._refresh_owner(owner_id)
 
+    def schedule_refresh(self, owner_id: int, *, delay: float = REFRESH_DEBOUNCE_SECONDS) -> None:
+        """Coalesces bursts of settings changes into one restart; setters already apply constraints."""
+        generation = self._refresh_generations.get(owner_id, 0) + 1
+        self._refresh_generations[owner_id] = generation
+        self._refresh_tasks[owner_id] = asyncio.create_task(
+            self._debounced_refresh(owner_id, generation, delay),
+            name=f"auto-sender-refresh-{owner_id}",
+        )
+
+    async def _debounced_refresh(self, owner_id: int, generation: int, delay: float) -> None:
+        try:
+            await asyncio.sleep(delay)
+            if self._refresh_generations.get(owner_id) != generation:
+                return
+            await self.refresh(owner_id=owner_id)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self._logger.exception("Не удалось обновить авторассылку пользователя %s.", owner_id)
+        finally:
+            if self._refresh_tasks.get(owner_id) is asyncio.current_task():
+                self._refresh_tasks.pop(owner_id, None)
+
     async def _start_for_owner(self, owner_id: int) -> None:
         if not await self._prepare_campaign(owner_id):
             return
@@ -108,16 +147,7 @@ class AutoSender:
                 if not message or not targets or interval <= 0:
                     await self._storage.set_auto_enabled(owner_id, False)
                     break
-                success = 0
-                errors: List[str] = []
-                for chat_id in targets:
-                    try:
-                        await self._send_message(chat_id, message)
-                        success += 1
-                    except (BotKicked, ChatNotFound, Unauthorized) as exc:
-                        errors.append(f"Недоступен чат {chat_id}: {exc}")
-                    except Exception as exc:  # pragma: no cover - network errors
-                        errors.append(f"Ошибка доставки в чат {chat_id}: {exc}")
+                success, errors = await self._send_many(targets, message)
                 await self._storage.update_stats(owner_id, sent=success, errors=errors)
                 wait_for = max(1, interval * 60)
                 try:
@@ -134,6 +164,31 @@ class AutoSender:
                     self._stop_events.pop(owner_id, None)
                 stop_event.clear()
 
+    async def _send_many(self, chat_ids: Iterable[int], message: str) -> Tuple[int, List[str]]:
+        chat_ids = list(chat_ids)
+
+        async def _send_one(chat_id: int) -> None:
+            async with self._send_semaphore:
+                async with self._rate_limiter:
+                    await self._send_message(chat_id, message)
+
+        results = await asyncio.gather(
+            *(_send_one(chat_id) for chat_id in chat_ids),
+            return_exceptions=True,
+        )
+        success = 0
+        errors: List[str] = []
+        for chat_id, result in zip(chat_ids, results):
+            if isinstance(result, (BotKicked, ChatNotFound, Unauthorized)):
+                errors.append(f"Недоступен чат {chat_id}: {result}")
+            elif isinstance(result, Exception):  # pragma: no cover - network errors
+                errors.append(f"Ошибка доставки в чат {chat_id}: {result}")
+            elif isinstance(result, BaseException):
+                raise result
+            else:
+                success += 1
+        return success, errors
+
     async def _payments_ready(self, owner_id: int) -> bool:
         user_paid = await self._storage.has_recent_payment_for_user(
             owner_id,
@@ -0,0 +1,71 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Set, Tuple
+
+
+class EditCoalescer:
+    """Delays message edits briefly and only sends the latest one per message."""
+
+    def __init__(
+        self,
+        edit: Callable[..., Awaitable[None]],
+        *,
+        delay: float = 0.15,
+        on_superseded: Optional[Callable[[Hashable], None]] = None,
+    ) -> None:
+        self._edit = edit
+        self._delay = max(0.0, delay)
+        self._on_superseded = on_superseded
+        self._logger = logging.getLogger(__name__)
+        self._pending: Dict[Hashable, Tuple[asyncio.TimerHandle, Tuple[Any, ...], Dict[str, Any]]] = {}
+        self._last_tasks: Dict[Hashable, asyncio.Task[None]] = {}
+        self._tasks: Set[asyncio.Task[None]] = set()
+
+    def schedule(self, key: Hashable, *args: Any, **kwargs: Any) -> None:
+        self.discard(key)
+        handle = asyncio.get_running_loop().call_later(self._delay, self._flush, key)
+        self._pending[key] = (handle, args, kwargs)
+
+    def discard(self, key: Hashable) -> None:
+        pending = self._pending.pop(key, None)
+        if pending:
+            pending[0].cancel()
+            if self._on_superseded:
+                self._on_superseded(key)
+
+    async def discard_and_wait(self, key: Hashable) -> None:
+        """Drops the queued edit and waits out one already in flight, so a direct edit lands last."""
+        self.discard(key)
+        running = self._last_tasks.get(key)
+        if running and not running.done():
+            # Shielded: cancelling the caller must not cancel an edit other callers chain behind.
+            await asyncio.shield(running)
+
+    def _flush(self, key: Hashable) -> None:
+        pending = self._pending.pop(key, None)
+        if pending is None:
+            return
+        _, args, kwargs = pending
+        previous = self._last_tasks.get(key)
+        task = asyncio.create_task(self._run(key, previous, args, kwargs))
+        self._last_tasks[key] = task
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _run(
+        self,
+        key: Hashable,
+        previous: Optional["asyncio.Task[None]"],
+        args: Tuple[Any, ...],
+        kwargs: Dict[str, Any],
+    ) -> None:
+        if previous and not previous.done():
+            # Keep edits of one message in order; _run never raises.
+            await previous
+        try:
+            await self._edit(*args, **kwargs)
+        except Exception:
+            self._logger.exception("Не удалось обновить сообщение %s.", key)
+        finally:
+            if self._last_tasks.get(key) is asyncio.current_task():
+                self._last_tasks.pop(key, None)
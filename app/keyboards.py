@@ -1,4 +1,5 @@
-from typing import Any, Dict, Iterable, List
+from functools import lru_cache
+from typing import Any, Dict, FrozenSet, Iterable, List, Tuple
 
 from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
 
@@ -50,6 +51,10 @@ def auto_menu_keyboard(*, is_enabled: bool, allow_group_pick: bool) -> InlineKey
     return InlineKeyboardMarkup(inline_keyboard=keyboard)
 
 
+# (chat_id, title, delivery_available) for every known chat, in storage order.
+_ChatEntries = Tuple[Tuple[int, Any, bool], ...]
+
+
 def groups_keyboard(
     known_chats: Dict[str, Dict[str, Any]],
     selected_ids: Iterable[int],
@@ -58,12 +63,29 @@ def groups_keyboard(
     page: int = 0,
     page_size: int = 20,
 ) -> InlineKeyboardMarkup:
-    selected_set = set(selected_ids)
+    chats: _ChatEntries = tuple(
+        (int(chat_key), info.get("title", ""), bool(info.get("delivery_available")))
+        for chat_key, info in known_chats.items()
+    )
+    return _groups_keyboard(chats, frozenset(selected_ids), origin, page, page_size)
+
+
+@lru_cache(maxsize=32)
+def _sorted_chats(chats: _ChatEntries) -> _ChatEntries:
+    return tuple(sorted(chats, key=lambda chat: chat[1]))
+
+
+@lru_cache(maxsize=128)
+def _groups_keyboard(
+    chats: _ChatEntries,
+    selected_set: FrozenSet[int],
+    origin: str,
+    page: int,
+    page_size: int,
+) -> InlineKeyboardMarkup:
+    # Cached markups are shared between callers, so they must never be mutated.
     rows: List[List[InlineKeyboardButton]] = []
-    sorted_items = [
-        (int(chat_key), info)
-        for chat_key, info in sorted(known_chats.items(), key=lambda item: item[1].get("title", ""))
-    ]
+    sorted_items = _sorted_chats(chats)
     total = len(sorted_items)
     if total == 0:
         return InlineKeyboardMarkup(
@@ -77,13 +99,12 @@ def groups_keyboard(
     start = current_page * page_size
     end = start + page_size
     page_items = sorted_items[start:end]
-    chat_ids = [chat_id for chat_id, _ in sorted_items]
-    available_chat_ids = [chat_id for chat_id, info in sorted_items if info.get("delivery_available")]
+    available_chat_ids = [chat_id for chat_id, _, available in sorted_items if available]
     all_selected = bool(available_chat_ids) and all(chat_id in selected_set for chat_id in available_chat_ids)
-    for chat_id, chat_info in page_items:
-        title = chat_info.get("title") or f"Чат {chat_id}"
+    for chat_id, raw_title, available in page_items:
+        title = raw_title or f"Чат {chat_id}"
         prefix = "✅" if chat_id in selected_set else "➕"
-        availability_marker = "🤖" if chat_info.get("delivery_available") else "🚫"
+        availability_marker = "🤖" if available else "🚫"
         rows.append(
             [
                 InlineKeyboardButton(
@@ -0,0 +1,23 @@
+from typing import Any, Dict, List
+
+from aiogram import types
+from aiogram.dispatcher.middlewares import BaseMiddleware
+
+from .storage import Storage
+
+
+class StorageCacheMiddleware(BaseMiddleware):
+    """Scopes Storage read caching to the processing of a single update."""
+
+    async def on_pre_process_update(self, update: types.Update, data: Dict[str, Any]) -> None:
+        data["storage_cache_token"] = Storage.open_read_cache()
+
+    async def on_post_process_update(
+        self,
+        update: types.Update,
+        result: List[Any],
+        data: Dict[str, Any],
+    ) -> None:
+        token = data.pop("storage_cache_token", None)
+        if token is not None:
+            Storage.close_read_cache(token)
@@ -1,9 +1,18 @@
+import asyncio
+import pickle
+import sys
 from datetime import datetime
 from pathlib import Path
 from typing import Any, Dict, List
 
 from fpdf import FPDF
 
+# fpdf is pure Python, so reports render in a fresh interpreter rather than a thread. A
+# multiprocessing pool would fork the threaded bot or, with spawn/forkserver, re-import bot.py.
+RENDER_CONCURRENCY = 2
+RENDER_COMMAND = (sys.executable, "-m", "app.pdf_reports")
+_PROJECT_DIR = Path(__file__).resolve().parent.parent
+_render_semaphore = asyncio.Semaphore(RENDER_CONCURRENCY)
 
 _CYRILLIC_MAP = {
     "а": "a",
@@ -80,6 +89,11 @@ def _format_datetime(value: Any) -> str:
 
 def build_payments_pdf(payments: List[Dict[str, Any]], destination: Path) -> Path:
     destination.parent.mkdir(parents=True, exist_ok=True)
+    destination.write_bytes(render_payments_pdf(payments))
+    return destination
+
+
+def render_payments_pdf(payments: List[Dict[str, Any]]) -> bytes:
     pdf = FPDF()
     pdf.set_auto_page_break(auto=True, margin=15)
     pdf.add_page()
@@ -113,5 +127,34 @@ def build_payments_pdf(payments: List[Dict[str, Any]], destination: Path) -> Pat
         for line in lines:
             pdf.multi_cell(0, 6, _transliterate(line))
         pdf.ln(2)
-    pdf.output(str(destination))
-    return destination
+    # fpdf 1.7 returns the document as a latin-1 str when dest="S".
+    data = pdf.output(dest="S")
+    return data.encode("latin-1") if isinstance(data, str) else bytes(data)
+
+
+async def render_payments_pdf_in_subprocess(payments: List[Dict[str, Any]]) -> bytes:
+    async with _render_semaphore:
+        process = await asyncio.create_subprocess_exec(
+            *RENDER_COMMAND,
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            cwd=_PROJECT_DIR,
+        )
+        try:
+            stdout, stderr = await process.communicate(pickle.dumps(payments))
+        except BaseException:
+            process.kill()
+            raise
+    if process.returncode != 0:
+        raise RuntimeError(f"PDF rendering failed: {stderr.decode(errors='replace').strip()}")
+    return stdout
+
+
+def _main() -> None:
+    payments = pickle.load(sys.stdin.buffer)
+    sys.stdout.buffer.write(render_payments_pdf(payments))
+
+
+if __name__ == "__main__":
+    _main()
@@ -0,0 +1,32 @@
+import asyncio
+import time
+from collections import deque
+from typing import Deque
+
+
+class RateLimiter:
+    """Sliding-window limiter: at most ``max_rate`` acquisitions per ``period`` seconds."""
+
+    def __init__(self, max_rate: int, period: float = 1.0) -> None:
+        self._max_rate = max(1, max_rate)
+        self._period = max(0.0, period)
+        self._timestamps: Deque[float] = deque()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                while self._timestamps and now - self._timestamps[0] >= self._period:
+                    self._timestamps.popleft()
+                if len(self._timestamps) < self._max_rate:
+                    self._timestamps.append(now)
+                    return
+                await asyncio.sleep(self._period - (now - self._timestamps[0]))
+
+    async def __aenter__(self) -> "RateLimiter":
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, *exc_info: object) -> None:
+        return None
@@ -1,9 +1,12 @@
 import asyncio
 import json
 import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from contextvars import ContextVar, Token, copy_context
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+from functools import partial, wraps
+from typing import Any, Awaitable, Callable, Dict, Hashable, Iterable, List, Optional, Sequence, Set, Tuple, TypeVar
 from uuid import uuid4
 
 try:
@@ -14,6 +17,33 @@ except ImportError:  # pragma: no cover - driver optional
     dict_row = None
 
 
+class ReadCache:
+    """Memo of hot read queries for one update; any committed write clears it."""
+
+    def __init__(self) -> None:
+        self.active = True
+        self.values: Dict[Hashable, Any] = {}
+
+    def close(self) -> None:
+        self.active = False
+        self.values.clear()
+
+
+_read_cache: ContextVar[Optional[ReadCache]] = ContextVar("storage_read_cache", default=None)
+
+_T = TypeVar("_T")
+
+
+def _offloaded(method: Callable[..., _T]) -> Callable[..., Awaitable[_T]]:
+    """Turns a blocking Storage method into a coroutine that runs it via Storage._run_locked."""
+
+    @wraps(method)
+    async def wrapper(self: "Storage", *args: Any, **kwargs: Any) -> _T:
+        return await self._run_locked(method, self, *args, **kwargs)
+
+    return wrapper
+
+
 class Storage:
     def __init__(
         self,
@@ -27,7 +57,11 @@ class Storage:
         self._database_url = database_url
         self._is_postgres = bool(database_url)
         self._lock = asyncio.Lock()
+        # sqlite3/psycopg calls block, so queries run on this thread instead of the event loop.
+        self._db_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="storage")
         self._legacy_auto_defaults: Optional[Tuple[Optional[str], int]] = None
+        # Known chats change only on membership events but are read on every button press.
+        self._known_chats: Optional[Dict[str, Dict[str, Any]]] = None
         if self._is_postgres:
             if not database_url:
                 raise ValueError("DATABASE_URL must be provided for PostgreSQL storage.")
@@ -75,123 +109,161 @@ class Storage:
     def _commit(self) -> None:
         if not self._is_postgres:
             self._conn.commit()
+        cache = _read_cache.get()
+        if cache is not None:
+            cache.values.clear()
+
+    @staticmethod
+    def open_read_cache() -> Token:
+        return _read_cache.set(ReadCache())
+
+    @staticmethod
+    def close_read_cache(token: Token) -> None:
+        cache = _read_cache.get()
+        if cache is not None:
+            cache.close()
+        _read_cache.reset(token)
+
+    def _in_db_thread(self, func: Callable[..., _T], *args: Any, **kwargs: Any) -> "asyncio.Future[_T]":
+        # A single worker owns the connection, so a cancelled caller never overlaps the next query.
+        # The copied context keeps this update's ReadCache visible to _commit.
+        call = partial(copy_context().run, func, *args, **kwargs)
+        return asyncio.get_running_loop().run_in_executor(self._db_executor, call)
+
+    async def _run_locked(self, func: Callable[..., _T], *args: Any, **kwargs: Any) -> _T:
+        async with self._lock:
+            return await self._in_db_thread(func, *args, **kwargs)
+
+    async def _cached_read(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        cache = _read_cache.get()
+        if cache is not None and not cache.active:
+            cache = None
+        if cache is not None and key in cache.values:
+            return cache.values[key]
+        async with self._lock:
+            value = await self._in_db_thread(loader)
+            if cache is not None:
+                cache.values[key] = value
+            return value
 
     def _bool_param(self, value: bool) -> Any:
         if self._is_postgres:
             return bool(value)
         return 1 if value else 0
 
-    async def get_data(self) -> Dict[str, Any]:
-        async with self._lock:
-            return {
-                "auto": self._get_auto_overview_locked(),
-                "campaigns": self._list_auto_campaigns_locked(),
-                "known_chats": self._list_known_chats_locked(),
-                "payments": self._list_payments_locked(),
-                "sessions": self._list_sessions_locked(),
-            }
+    @_offloaded
+    def get_data(self) -> Dict[str, Any]:
+        return {
+            "auto": self._get_auto_overview_locked(),
+            "campaigns": self._list_auto_campaigns_locked(),
+            "known_chats": self._known_chats_locked(),
+            "payments": self._list_payments_locked(),
+            "sessions": self._list_sessions_locked(),
+        }
 
     async def get_auto(self, owner_id: Optional[int] = None) -> Dict[str, Any]:
-        async with self._lock:
-            if owner_id is None:
-                return self._get_auto_overview_locked()
-            return self._get_auto_campaign_locked(owner_id)
+        if owner_id is None:
+            return await self._cached_read(("auto", None), self._get_auto_overview_locked)
+        return await self._cached_read(
+            ("auto", owner_id),
+            lambda: self._get_auto_campaign_locked(owner_id),
+        )
 
-    async def list_auto_campaigns(self) -> List[Dict[str, Any]]:
-        async with self._lock:
-            return self._list_auto_campaigns_locked()
+    @_offloaded
+    def list_auto_campaigns(self) -> List[Dict[str, Any]]:
+        return self._list_auto_campaigns_locked()
 
-    async def list_active_campaigns(self) -> List[Dict[str, Any]]:
-        async with self._lock:
-            rows = self._execute(
-                "SELECT owner_id FROM auto_campaigns WHERE is_enabled = ?",
-                (1,),
-            ).fetchall()
-            return [self._get_auto_campaign_locked(int(row["owner_id"])) for row in rows]
+    @_offloaded
+    def list_active_campaigns(self) -> List[Dict[str, Any]]:
+        rows = self._execute(
+            "SELECT owner_id FROM auto_campaigns WHERE is_enabled = ?",
+            (1,),
+        ).fetchall()
+        return [self._get_auto_campaign_locked(int(row["owner_id"])) for row in rows]
 
-    async def set_auto_message(self, owner_id: int, message: str) -> None:
-        async with self._lock:
-            self._ensure_campaign_locked(owner_id)
-            self._execute(
-                "UPDATE auto_campaigns SET message = ? WHERE owner_id = ?",
-                (message, owner_id),
-            )
-            self._commit()
+    @_offloaded
+    def set_auto_message(self, owner_id: int, message: str) -> Dict[str, Any]:
+        self._ensure_campaign_locked(owner_id)
+        self._execute(
+            "UPDATE auto_campaigns SET message = ? WHERE owner_id = ?",
+            (message, owner_id),
+        )
+        self._apply_constraints_locked(owner_id)
+        self._commit()
+        return self._get_auto_campaign_locked(owner_id)
 
-    async def set_auto_interval(self, owner_id: int, minutes: int) -> None:
-        async with self._lock:
-            self._ensure_campaign_locked(owner_id)
-            self._execute(
-                "UPDATE auto_campaigns SET interval_minutes = ? WHERE owner_id = ?",
-                (minutes, owner_id),
-            )
-            self._commit()
+    @_offloaded
+    def set_auto_interval(self, owner_id: int, minutes: int) -> Dict[str, Any]:
+        self._ensure_campaign_locked(owner_id)
+        self._execute(
+            "UPDATE auto_campaigns SET interval_minutes = ? WHERE owner_id = ?",
+            (minutes, owner_id),
+        )
+        self._apply_constraints_locked(owner_id)
+        self._commit()
+        return self._get_auto_campaign_locked(owner_id)
 
-    async def set_auto_enabled(self, owner_id: int, enabled: bool) -> None:
-        async with self._lock:
-            self._ensure_campaign_locked(owner_id)
-            self._execute(
-                "UPDATE auto_campaigns SET is_enabled = ? WHERE owner_id = ?",
-                (1 if enabled else 0, owner_id),
-            )
-            self._commit()
+    @_offloaded
+    def set_auto_enabled(self, owner_id: int, enabled: bool) -> Dict[str, Any]:
+        self._ensure_campaign_locked(owner_id)
+        self._execute(
+            "UPDATE auto_campaigns SET is_enabled = ? WHERE owner_id = ?",
+            (1 if enabled else 0, owner_id),
+        )
+        self._commit()
+        return self._get_auto_campaign_locked(owner_id)
 
-    async def toggle_target_chat(self, owner_id: int, chat_id: int, title: Optional[str] = None) -> bool:
-        async with self._lock:
-            self._ensure_campaign_locked(owner_id)
-            cur = self._execute(
-                "SELECT 1 FROM auto_campaign_targets WHERE owner_id = ? AND chat_id = ?",
-                (owner_id, chat_id),
-            )
-            exists = cur.fetchone() is not None
-            if exists:
-                self._execute(
-                    "DELETE FROM auto_campaign_targets WHERE owner_id = ? AND chat_id = ?",
-                    (owner_id, chat_id),
-                )
-                self._commit()
-                return False
-            self._execute(
-                """
-                INSERT INTO auto_campaign_targets (owner_id, chat_id)
-                VALUES (?, ?)
-                ON CONFLICT (owner_id, chat_id) DO NOTHING
-                """,
-                (owner_id, chat_id),
-            )
-            if title:
-                self._ensure_known_chat_locked(chat_id, title)
-            self._commit()
-            return True
+    @_offloaded
+    def toggle_target_chat(self, owner_id: int, chat_id: int, title: Optional[str] = None) -> bool:
+        return self._toggle_target_chat_locked(owner_id, chat_id, title)
 
-    async def update_stats(self, owner_id: int, *, sent: int, errors: List[str]) -> None:
-        async with self._lock:
-            self._ensure_campaign_locked(owner_id)
-            stats = self._execute(
-                "SELECT sent_total FROM auto_campaign_stats WHERE owner_id = ?",
-                (owner_id,),
-            ).fetchone()
-            sent_total = (stats["sent_total"] if stats else 0) + sent
-            self._execute(
-                """
-                UPDATE auto_campaign_stats
-                SET sent_total = ?, last_sent_at = ?, last_error = ?
-                WHERE owner_id = ?
-                """,
-                (
-                    sent_total,
-                    datetime.utcnow().isoformat(),
-                    "\n".join(errors) if errors else None,
-                    owner_id,
-                ),
-            )
+    @_offloaded
+    def toggle_and_snapshot(
+        self,
+        owner_id: int,
+        chat_id: int,
+        title: Optional[str] = None,
+    ) -> Tuple[bool, Dict[str, Dict[str, Any]], Dict[str, Any]]:
+        """Toggles a target chat and returns (selected, known chats, campaign) under one lock."""
+        selected = self._toggle_target_chat_locked(owner_id, chat_id, title)
+        if self._apply_constraints_locked(owner_id):
             self._commit()
+        return (
+            selected,
+            self._known_chats_locked(),
+            self._get_auto_campaign_locked(owner_id),
+        )
+
+    @_offloaded
+    def update_stats(self, owner_id: int, *, sent: int, errors: List[str]) -> None:
+        self._ensure_campaign_locked(owner_id)
+        stats = self._execute(
+            "SELECT sent_total FROM auto_campaign_stats WHERE owner_id = ?",
+            (owner_id,),
+        ).fetchone()
+        sent_total = (stats["sent_total"] if stats else 0) + sent
+        self._execute(
+            """
+            UPDATE auto_campaign_stats
+            SET sent_total = ?, last_sent_at = ?, last_error = ?
+            WHERE owner_id = ?
+            """,
+            (
+                sent_total,
+                datetime.utcnow().isoformat(),
+                "\n".join(errors) if errors else None,
+                owner_id,
+            ),
+        )
+        self._commit()
 
     async def list_known_chats(self) -> Dict[str, Dict[str, Any]]:
-        async with self._lock:
-            return self._list_known_chats_locked()
+        if self._known_chats is not None:
+            return self._known_chats
+        return await self._run_locked(self._known_chats_locked)
 
-    async def upsert_known_chat(
+    @_offloaded
+    def upsert_known_chat(
         self,
         chat_id: int,
         title: str,
@@ -199,113 +271,138 @@ class Storage:
         ensure_target: bool = False,
         delivery_available: Optional[bool] = None,
     ) -> None:
-        async with self._lock:
-            self._ensure_known_chat_locked(chat_id, title, delivery_available=delivery_available)
-            if ensure_target:
-                self._execute(
-                    "INSERT INTO auto_targets (chat_id) VALUES (?) ON CONFLICT (chat_id) DO NOTHING",
-                    (chat_id,),
-                )
-            self._commit()
-
-    async def remove_known_chat(self, chat_id: int) -> None:
-        async with self._lock:
-            self._execute("DELETE FROM known_chats WHERE chat_id = ?", (chat_id,))
-            self._execute("DELETE FROM auto_targets WHERE chat_id = ?", (chat_id,))
+        self._ensure_known_chat_locked(chat_id, title, delivery_available=delivery_available)
+        if ensure_target:
             self._execute(
-                "DELETE FROM auto_campaign_targets WHERE chat_id = ?",
+                "INSERT INTO auto_targets (chat_id) VALUES (?) ON CONFLICT (chat_id) DO NOTHING",
                 (chat_id,),
             )
-            self._commit()
+        self._commit()
 
-    async def set_delivery_available(self, chat_id: int, available: bool) -> None:
-        async with self._lock:
-            self._execute(
-                "UPDATE known_chats SET delivery_available = ? WHERE chat_id = ?",
-                (self._bool_param(available), chat_id),
-            )
-            self._commit()
+    @_offloaded
+    def bulk_upsert_known_chats(self, chats: Iterable[Tuple[int, str]]) -> None:
+        rows = [
+            (chat_id, title.strip() if title else f"Чат {chat_id}")
+            for chat_id, title in chats
+        ]
+        if not rows:
+            return
+        self._executemany(
+            """
+            INSERT INTO known_chats (chat_id, title)
+            VALUES (?, ?)
+            ON CONFLICT(chat_id) DO UPDATE SET title = excluded.title
+            """,
+            rows,
+        )
+        self._known_chats = None
+        self._commit()
 
-    async def is_delivery_available(self, chat_id: int) -> bool:
-        async with self._lock:
-            row = self._execute(
-                "SELECT delivery_available FROM known_chats WHERE chat_id = ?",
-                (chat_id,),
-            ).fetchone()
-            return bool(row and row["delivery_available"])
+    @_offloaded
+    def remove_known_chat(self, chat_id: int) -> None:
+        self._execute("DELETE FROM known_chats WHERE chat_id = ?", (chat_id,))
+        self._execute("DELETE FROM auto_targets WHERE chat_id = ?", (chat_id,))
+        self._execute(
+            "DELETE FROM auto_campaign_targets WHERE chat_id = ?",
+            (chat_id,),
+        )
+        self._known_chats = None
+        self._commit()
 
-    async def list_delivery_ready_chat_ids(self) -> Set[int]:
-        async with self._lock:
-            if self._is_postgres:
-                rows = self._execute(
-                    "SELECT chat_id FROM known_chats WHERE delivery_available = %s",
-                    (self._bool_param(True),),
-                ).fetchall()
-            else:
-                rows = self._execute(
-                    "SELECT chat_id FROM known_chats WHERE delivery_available = 1"
-                ).fetchall()
-            return {int(row["chat_id"]) for row in rows}
+    @_offloaded
+    def set_delivery_available(self, chat_id: int, available: bool) -> None:
+        self._execute(
+            "UPDATE known_chats SET delivery_available = ? WHERE chat_id = ?",
+            (self._bool_param(available), chat_id),
+        )
+        self._known_chats = None
+        self._commit()
 
-    async def replace_delivery_ready_chat_ids(self, chat_ids: Set[int]) -> None:
-        async with self._lock:
-            reset_value = False if self._is_postgres else 0
+    @_offloaded
+    def is_delivery_available(self, chat_id: int) -> bool:
+        row = self._execute(
+            "SELECT delivery_available FROM known_chats WHERE chat_id = ?",
+            (chat_id,),
+        ).fetchone()
+        return bool(row and row["delivery_available"])
+
+    @_offloaded
+    def list_delivery_ready_chat_ids(self) -> Set[int]:
+        if self._is_postgres:
+            rows = self._execute(
+                "SELECT chat_id FROM known_chats WHERE delivery_available = %s",
+                (self._bool_param(True),),
+            ).fetchall()
+        else:
+            rows = self._execute(
+                "SELECT chat_id FROM known_chats WHERE delivery_available = 1"
+            ).fetchall()
+        return {int(row["chat_id"]) for row in rows}
+
+    @_offloaded
+    def replace_delivery_ready_chat_ids(self, chat_ids: Set[int]) -> None:
+        reset_value = False if self._is_postgres else 0
+        if self._is_postgres:
+            self._execute("UPDATE known_chats SET delivery_available = %s", (reset_value,))
+        else:
+            self._execute("UPDATE known_chats SET delivery_available = 0")
+        if chat_ids:
+            value = self._bool_param(True)
             if self._is_postgres:
-                self._execute("UPDATE known_chats SET delivery_available = %s", (reset_value,))
+                self._executemany(
+                    "UPDATE known_chats SET delivery_available = %s WHERE chat_id = %s",
+                    ((value, chat_id) for chat_id in chat_ids),
+                )
             else:
-                self._execute("UPDATE known_chats SET delivery_available = 0")
-            if chat_ids:
-                value = self._bool_param(True)
-                if self._is_postgres:
-                    self._executemany(
-                        "UPDATE known_chats SET delivery_available = %s WHERE chat_id = %s",
-                        ((value, chat_id) for chat_id in chat_ids),
-                    )
-                else:
-                    self._executemany(
-                        "UPDATE known_chats SET delivery_available = ? WHERE chat_id = ?",
-                        ((value, chat_id) for chat_id in chat_ids),
-                    )
-            self._commit()
+                self._executemany(
+                    "UPDATE known_chats SET delivery_available = ? WHERE chat_id = ?",
+                    ((value, chat_id) for chat_id in chat_ids),
+                )
+        self._known_chats = None
+        self._commit()
 
-    async def mark_all_chats_delivery_available(self) -> None:
-        async with self._lock:
-            value = self._bool_param(True)
-            self._execute(
-                "UPDATE known_chats SET delivery_available = ?" if self._is_postgres else "UPDATE known_chats SET delivery_available = 1",
-                (value,) if self._is_postgres else (),
-            )
-            self._commit()
+    @_offloaded
+    def mark_all_chats_delivery_available(self) -> None:
+        value = self._bool_param(True)
+        self._execute(
+            "UPDATE known_chats SET delivery_available = ?" if self._is_postgres else "UPDATE known_chats SET delivery_available = 1",
+            (value,) if self._is_postgres else (),
+        )
+        self._known_chats = None
+        self._commit()
 
-    async def set_target_chats(self, owner_id: int, chat_ids: Iterable[int]) -> None:
-        async with self._lock:
-            self._ensure_campaign_locked(owner_id)
-            unique_ids: List[int] = []
-            seen = set()
-            for chat_id in chat_ids:
-                try:
-                    cid = int(chat_id)
-                except (TypeError, ValueError):
-                    continue
-                if cid in seen:
-                    continue
-                seen.add(cid)
-                unique_ids.append(cid)
-            self._execute(
-                "DELETE FROM auto_campaign_targets WHERE owner_id = ?",
-                (owner_id,),
+    @_offloaded
+    def set_target_chats(self, owner_id: int, chat_ids: Iterable[int]) -> Dict[str, Any]:
+        self._ensure_campaign_locked(owner_id)
+        unique_ids: List[int] = []
+        seen = set()
+        for chat_id in chat_ids:
+            try:
+                cid = int(chat_id)
+            except (TypeError, ValueError):
+                continue
+            if cid in seen:
+                continue
+            seen.add(cid)
+            unique_ids.append(cid)
+        self._execute(
+            "DELETE FROM auto_campaign_targets WHERE owner_id = ?",
+            (owner_id,),
+        )
+        if unique_ids:
+            self._executemany(
+                """
+                INSERT INTO auto_campaign_targets (owner_id, chat_id)
+                VALUES (?, ?)
+                """,
+                ((owner_id, chat_id) for chat_id in unique_ids),
             )
-            if unique_ids:
-                self._executemany(
-                    """
-                    INSERT INTO auto_campaign_targets (owner_id, chat_id)
-                    VALUES (?, ?)
-                    """,
-                    ((owner_id, chat_id) for chat_id in unique_ids),
-                )
-            self._commit()
+        self._apply_constraints_locked(owner_id)
+        self._commit()
+        return self._get_auto_campaign_locked(owner_id)
 
-    async def create_payment_request(
+    @_offloaded
+    def create_payment_request(
         self,
         *,
         user_id: int,
@@ -314,227 +411,257 @@ class Storage:
         card_number: str,
         card_name: str,
     ) -> str:
-        async with self._lock:
-            request_id = uuid4().hex
-            created_at = datetime.utcnow().isoformat()
-            self._execute(
-                """
-                INSERT INTO payments (
-                    request_id, user_id, username, full_name,
-                    card_number, card_name, status, created_at
-                ) VALUES (?, ?, ?, ?, ?, ?, 'pending', ?)
-                """,
-                (request_id, user_id, username, full_name, card_number, card_name, created_at),
-            )
-            self._commit()
-            return request_id
+        request_id = uuid4().hex
+        created_at = datetime.utcnow().isoformat()
+        self._execute(
+            """
+            INSERT INTO payments (
+                request_id, user_id, username, full_name,
+                card_number, card_name, status, created_at
+            ) VALUES (?, ?, ?, ?, ?, ?, 'pending', ?)
+            """,
+            (request_id, user_id, username, full_name, card_number, card_name, created_at),
+        )
+        self._commit()
+        return request_id
 
-    async def set_payment_status(
+    @_offloaded
+    def set_payment_status(
         self,
         request_id: str,
         *,
         status: str,
         admin_id: int,
         admin_username: Optional[str],
+        expected_status: Optional[str] = None,
     ) -> Optional[Dict[str, Any]]:
-        async with self._lock:
-            row = self._execute(
-                "SELECT request_id FROM payments WHERE request_id = ?",
-                (request_id,),
-            ).fetchone()
-            if not row:
-                return None
-            resolved_at = datetime.utcnow().isoformat()
-            self._execute(
-                """
-                UPDATE payments
-                SET status = ?,
-                    resolved_at = ?,
-                    resolved_by_admin_id = ?,
-                    resolved_by_admin_username = ?
-                WHERE request_id = ?
-                """,
-                (status, resolved_at, admin_id, admin_username, request_id),
-            )
-            self._commit()
-            return self._fetch_payment_locked(request_id)
+        """Resolves a payment (only from ``expected_status`` if given); None if nothing was updated."""
+        query = """
+            UPDATE payments
+            SET status = ?,
+                resolved_at = ?,
+                resolved_by_admin_id = ?,
+                resolved_by_admin_username = ?
+            WHERE request_id = ?
+        """
+        params: List[Any] = [status, datetime.utcnow().isoformat(), admin_id, admin_username, request_id]
+        if expected_status is not None:
+            query += " AND status = ?"
+            params.append(expected_status)
+        cur = self._execute(query, params)
+        if not cur.rowcount:
+            # sqlite3 opened a write transaction for the UPDATE; end it so other writers are not locked out.
+            self._conn.rollback()
+            return None
+        self._commit()
+        return self._fetch_payment_locked(request_id)
 
-    async def get_payment(self, request_id: str) -> Optional[Dict[str, Any]]:
-        async with self._lock:
-            return self._fetch_payment_locked(request_id)
+    @_offloaded
+    def get_payment(self, request_id: str) -> Optional[Dict[str, Any]]:
+        return self._fetch_payment_locked(request_id)
 
     async def has_recent_payment(self, *, within_days: int) -> bool:
-        async with self._lock:
-            threshold = datetime.utcnow() - timedelta(days=max(0, within_days))
-            cur = self._execute(
-                """
-                SELECT resolved_at FROM payments
-                WHERE status = 'approved' AND resolved_at IS NOT NULL
-                ORDER BY resolved_at DESC
-                LIMIT 1
-                """
-            ).fetchone()
-            if not cur:
-                return False
-            try:
-                resolved_dt = datetime.fromisoformat(cur["resolved_at"])
-            except (TypeError, ValueError):
-                return False
-            return resolved_dt >= threshold
+        _, is_valid = await self.payment_snapshot(within_days=within_days)
+        return is_valid
+
+    async def payment_snapshot(self, *, within_days: int) -> Tuple[Optional[datetime], bool]:
+        """Return the latest approved payment time and whether it is within ``within_days``."""
+        threshold = datetime.utcnow() - timedelta(days=max(0, within_days))
+        latest = await self.latest_payment_timestamp()
+        return latest, latest is not None and latest >= threshold
 
     async def has_recent_payment_for_user(self, user_id: int, *, within_days: int) -> bool:
-        async with self._lock:
-            threshold = datetime.utcnow() - timedelta(days=max(0, within_days))
-            cur = self._execute(
-                """
-                SELECT resolved_at FROM payments
-                WHERE status = 'approved'
-                  AND user_id = ?
-                  AND resolved_at IS NOT NULL
-                ORDER BY resolved_at DESC
-                LIMIT 1
-                """,
-                (user_id,),
-            ).fetchone()
-            if not cur or not cur["resolved_at"]:
-                return False
-            try:
-                resolved_dt = datetime.fromisoformat(cur["resolved_at"])
-            except (TypeError, ValueError):
-                return False
-            return resolved_dt >= threshold
+        _, is_valid = await self.user_payment_snapshot(user_id, within_days=within_days)
+        return is_valid
+
+    async def user_payment_snapshot(self, user_id: int, *, within_days: int) -> Tuple[Optional[datetime], bool]:
+        """Like payment_snapshot, for a single user's approved payments."""
+        threshold = datetime.utcnow() - timedelta(days=max(0, within_days))
+        latest = await self.latest_payment_timestamp_for_user(user_id)
+        return latest, latest is not None and latest >= threshold
 
     async def latest_payment_timestamp(self) -> Optional[datetime]:
-        async with self._lock:
-            cur = self._execute(
-                """
-                SELECT resolved_at FROM payments
-                WHERE status = 'approved' AND resolved_at IS NOT NULL
-                ORDER BY resolved_at DESC
-                LIMIT 1
-                """
-            ).fetchone()
-            if not cur or cur["resolved_at"] is None:
-                return None
-            try:
-                return datetime.fromisoformat(cur["resolved_at"])
-            except ValueError:
-                return None
+        return await self._cached_read(("latest_payment",), self._latest_payment_timestamp_locked)
 
     async def latest_payment_timestamp_for_user(self, user_id: int) -> Optional[datetime]:
-        async with self._lock:
-            cur = self._execute(
-                """
-                SELECT resolved_at FROM payments
-                WHERE status = 'approved'
-                  AND user_id = ?
-                  AND resolved_at IS NOT NULL
-                ORDER BY resolved_at DESC
-                LIMIT 1
-                """,
-                (user_id,),
-            ).fetchone()
-            if not cur or cur["resolved_at"] is None:
-                return None
-            try:
-                return datetime.fromisoformat(cur["resolved_at"])
-            except ValueError:
-                return None
+        return await self._cached_read(
+            ("latest_payment", user_id),
+            lambda: self._latest_payment_timestamp_for_user_locked(user_id),
+        )
 
-    async def get_user_payments(self, user_id: int) -> List[Dict[str, Any]]:
-        async with self._lock:
-            rows = self._execute(
-                "SELECT * FROM payments WHERE user_id = ? ORDER BY created_at DESC",
-                (user_id,),
-            ).fetchall()
-            return [self._row_to_payment(row) for row in rows]
+    @_offloaded
+    def get_user_payments(self, user_id: int, *, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        query = "SELECT * FROM payments WHERE user_id = ? ORDER BY created_at DESC"
+        params: List[Any] = [user_id]
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+        rows = self._execute(query, params).fetchall()
+        return [self._row_to_payment(row) for row in rows]
 
-    async def get_latest_payment_for_user(self, user_id: int) -> Optional[Dict[str, Any]]:
-        async with self._lock:
-            row = self._execute(
-                """
-                SELECT * FROM payments
-                WHERE user_id = ?
-                ORDER BY created_at DESC
-                LIMIT 1
-                """,
-                (user_id,),
-            ).fetchone()
-            return self._row_to_payment(row) if row else None
+    @_offloaded
+    def get_latest_payment_for_user(self, user_id: int) -> Optional[Dict[str, Any]]:
+        row = self._execute(
+            """
+            SELECT * FROM payments
+            WHERE user_id = ?
+            ORDER BY created_at DESC
+            LIMIT 1
+            """,
+            (user_id,),
+        ).fetchone()
+        return self._row_to_payment(row) if row else None
 
-    async def find_user_id_by_username(self, username: str) -> Optional[int]:
-        async with self._lock:
-            row = self._execute(
-                """
-                SELECT user_id FROM payments
-                WHERE LOWER(username) = LOWER(?)
-                ORDER BY created_at DESC
-                LIMIT 1
-                """,
-                (username,),
-            ).fetchone()
-            return int(row["user_id"]) if row else None
+    @_offloaded
+    def find_user_id_by_username(self, username: str) -> Optional[int]:
+        row = self._execute(
+            """
+            SELECT user_id FROM payments
+            WHERE LOWER(username) = LOWER(?)
+            ORDER BY created_at DESC
+            LIMIT 1
+            """,
+            (username,),
+        ).fetchone()
+        return int(row["user_id"]) if row else None
 
-    async def get_all_payments(self) -> List[Dict[str, Any]]:
-        async with self._lock:
-            rows = self._execute(
-                "SELECT * FROM payments ORDER BY created_at DESC"
-            ).fetchall()
-            return [self._row_to_payment(row) for row in rows]
+    @_offloaded
+    def get_all_payments(self, *, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        query = "SELECT * FROM payments ORDER BY created_at DESC"
+        params: List[Any] = []
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+        rows = self._execute(query, params).fetchall()
+        return [self._row_to_payment(row) for row in rows]
 
-    async def set_user_role(self, user_id: int, role: str) -> None:
-        async with self._lock:
+    @_offloaded
+    def set_user_role(self, user_id: int, role: str) -> None:
+        self._execute(
+            """
+            INSERT INTO sessions (user_id, role, updated_at)
+            VALUES (?, ?, ?)
+            ON CONFLICT(user_id) DO UPDATE SET
+                role = excluded.role,
+                updated_at = excluded.updated_at
+            """,
+            (user_id, role, datetime.utcnow().isoformat()),
+        )
+        self._commit()
+
+    @_offloaded
+    def get_user_role(self, user_id: int) -> Optional[str]:
+        row = self._execute(
+            "SELECT role FROM sessions WHERE user_id = ?",
+            (user_id,),
+        ).fetchone()
+        return row["role"] if row else None
+
+    async def list_admin_user_ids(self) -> List[int]:
+        return await self._cached_read(("admin_user_ids",), self._list_admin_user_ids_locked)
+
+    @_offloaded
+    def ensure_constraints(self, owner_id: Optional[int] = None) -> None:
+        if owner_id is not None:
+            owner_ids = [owner_id]
+        else:
+            rows = self._execute("SELECT owner_id FROM auto_campaigns").fetchall()
+            owner_ids = [int(row["owner_id"]) for row in rows]
+        if not owner_ids:
+            return
+        changed = False
+        for oid in owner_ids:
+            self._ensure_campaign_locked(oid)
+            changed = self._apply_constraints_locked(oid) or changed
+        if changed:
+            self._commit()
+
+    def _apply_constraints_locked(self, owner_id: int) -> bool:
+        """Disables a campaign that lacks a message, targets or interval; True if it was disabled."""
+        campaign = self._get_auto_campaign_locked(owner_id)
+        has_message = bool(campaign["message"])
+        has_targets = bool(campaign["target_chat_ids"])
+        interval_ok = (campaign.get("interval_minutes") or 0) > 0
+        if has_message and has_targets and interval_ok:
+            return False
+        self._execute(
+            "UPDATE auto_campaigns SET is_enabled = 0 WHERE owner_id = ?",
+            (owner_id,),
+        )
+        return True
+
+    def _toggle_target_chat_locked(self, owner_id: int, chat_id: int, title: Optional[str]) -> bool:
+        self._ensure_campaign_locked(owner_id)
+        cur = self._execute(
+            "SELECT 1 FROM auto_campaign_targets WHERE owner_id = ? AND chat_id = ?",
+            (owner_id, chat_id),
+        )
+        exists = cur.fetchone() is not None
+        if exists:
             self._execute(
-                """
-                INSERT INTO sessions (user_id, role, updated_at)
-                VALUES (?, ?, ?)
-                ON CONFLICT(user_id) DO UPDATE SET
-                    role = excluded.role,
-                    updated_at = excluded.updated_at
-                """,
-                (user_id, role, datetime.utcnow().isoformat()),
+                "DELETE FROM auto_campaign_targets WHERE owner_id = ? AND chat_id = ?",
+                (owner_id, chat_id),
             )
             self._commit()
+            return False
+        self._execute(
+            """
+            INSERT INTO auto_campaign_targets (owner_id, chat_id)
+            VALUES (?, ?)
+            ON CONFLICT (owner_id, chat_id) DO NOTHING
+            """,
+            (owner_id, chat_id),
+        )
+        if title:
+            self._ensure_known_chat_locked(chat_id, title)
+        self._commit()
+        return True
 
-    async def get_user_role(self, user_id: int) -> Optional[str]:
-        async with self._lock:
-            row = self._execute(
-                "SELECT role FROM sessions WHERE user_id = ?",
-                (user_id,),
-            ).fetchone()
-            return row["role"] if row else None
+    def _latest_payment_timestamp_for_user_locked(self, user_id: int) -> Optional[datetime]:
+        cur = self._execute(
+            """
+            SELECT resolved_at FROM payments
+            WHERE status = 'approved'
+              AND user_id = ?
+              AND resolved_at IS NOT NULL
+            ORDER BY resolved_at DESC
+            LIMIT 1
+            """,
+            (user_id,),
+        ).fetchone()
+        if not cur or cur["resolved_at"] is None:
+            return None
+        try:
+            return datetime.fromisoformat(cur["resolved_at"])
+        except (TypeError, ValueError):
+            return None
 
-    async def list_admin_user_ids(self) -> List[int]:
-        async with self._lock:
-            rows = self._execute(
-                "SELECT user_id FROM sessions WHERE role = 'admin'"
-            ).fetchall()
-            return [int(row["user_id"]) for row in rows]
+    def _latest_payment_timestamp_locked(self) -> Optional[datetime]:
+        cur = self._execute(
+            """
+            SELECT resolved_at FROM payments
+            WHERE status = 'approved' AND resolved_at IS NOT NULL
+            ORDER BY resolved_at DESC
+            LIMIT 1
+            """
+        ).fetchone()
+        if not cur or cur["resolved_at"] is None:
+            return None
+        try:
+            return datetime.fromisoformat(cur["resolved_at"])
+        except ValueError:
+            return None
 
-    async def ensure_constraints(self, owner_id: Optional[int] = None) -> None:
-        async with self._lock:
-            if owner_id is not None:
-                owner_ids = [owner_id]
-            else:
-                rows = self._execute("SELECT owner_id FROM auto_campaigns").fetchall()
-                owner_ids = [int(row["owner_id"]) for row in rows]
-            if not owner_ids:
-                return
-            changed = False
-            for oid in owner_ids:
-                self._ensure_campaign_locked(oid)
-                campaign = self._get_auto_campaign_locked(oid)
-                has_message = bool(campaign["message"])
-                has_targets = bool(campaign["target_chat_ids"])
-                interval_ok = (campaign.get("interval_minutes") or 0) > 0
-                if not (has_message and has_targets and interval_ok):
-                    self._execute(
-                        "UPDATE auto_campaigns SET is_enabled = 0 WHERE owner_id = ?",
-                        (oid,),
-                    )
-                    changed = True
-            if changed:
-                self._commit()
+    def _list_admin_user_ids_locked(self) -> List[int]:
+        rows = self._execute(
+            "SELECT user_id FROM sessions WHERE role = 'admin'"
+        ).fetchall()
+        return [int(row["user_id"]) for row in rows]
+
+    def _known_chats_locked(self) -> Dict[str, Dict[str, Any]]:
+        if self._known_chats is None:
+            self._known_chats = self._list_known_chats_locked()
+        return self._known_chats
 
     def _list_known_chats_locked(self) -> Dict[str, Dict[str, Any]]:
         rows = self._execute(
@@ -568,6 +695,15 @@ class Storage:
         delivery_available: Optional[bool] = None,
     ) -> None:
         sanitized_title = title.strip() if title else f"Чат {chat_id}"
+        cached = self._known_chats.get(str(chat_id)) if self._known_chats is not None else None
+        if (
+            cached
+            and cached["title"] == sanitized_title
+            and (delivery_available is None or cached["delivery_available"] == delivery_available)
+        ):
+            # Nothing changes, so keep the cache instead of reloading the whole table.
+            return
+        self._known_chats = None
         if delivery_available is None:
             self._execute(
                 """
@@ -592,6 +728,12 @@ class Storage:
     def _init_db(self) -> None:
         if not self._is_postgres:
             self._execute("PRAGMA foreign_keys = ON")
+            # WAL lets readers proceed during writes; NORMAL skips an fsync per commit.
+            self._execute("PRAGMA journal_mode = WAL")
+            self._execute("PRAGMA synchronous = NORMAL")
+            # Keep sort/temp B-trees off disk and read pages through a memory map.
+            self._execute("PRAGMA temp_store = MEMORY")
+            self._execute("PRAGMA mmap_size = 268435456")
         self._execute(
             """
             CREATE TABLE IF NOT EXISTS auto_config (
@@ -645,6 +787,14 @@ class Storage:
             )
             """
         )
+        # Payment validity checks and per-user histories run on every menu render.
+        self._execute(
+            "CREATE INDEX IF NOT EXISTS idx_payments_status_resolved ON payments (status, resolved_at)"
+        )
+        self._execute(
+            "CREATE INDEX IF NOT EXISTS idx_payments_user_created ON payments (user_id, created_at)"
+        )
+        self._execute("CREATE INDEX IF NOT EXISTS idx_payments_created ON payments (created_at)")
         self._execute(
             """
             CREATE TABLE IF NOT EXISTS sessions (
@@ -1,6 +1,6 @@
 import asyncio
 import logging
-from typing import Optional, Set
+from typing import AsyncIterator, List, Optional, Set, Tuple
 
 from telethon import TelegramClient, utils as telethon_utils
 from telethon.sessions import StringSession
@@ -8,6 +8,9 @@ from telethon.tl import types as tl_types
 
 from .storage import Storage
 
+_SYNC_BATCH_SIZE = 64
+_SYNC_QUEUE_SIZE = 256
+
 
 class UserDelivery:
     """MTProto-based delivery helper that works with a user session."""
@@ -56,28 +59,59 @@ class UserDelivery:
         if not self._connected:
             raise RuntimeError("TD user client is not running.")
         async with self._sync_lock:
-            dialogs_iter = self._client.iter_dialogs(limit=self._dialogs_limit)
-            available_ids: Set[int] = set()
-            async for dialog in dialogs_iter:
-                entity = dialog.entity
-                chat_id = self._extract_group_id(entity)
-                if chat_id is None:
-                    continue
-                title = getattr(entity, "title", None) or getattr(entity, "username", None) or f"Чат {chat_id}"
-                await storage.upsert_known_chat(chat_id, title)
-                available_ids.add(chat_id)
+            queue: "asyncio.Queue[Optional[Tuple[int, str]]]" = asyncio.Queue(maxsize=_SYNC_QUEUE_SIZE)
+            producer = asyncio.create_task(self._fetch_dialogs_into(queue))
+            found_ids: List[int] = []
+            batch: List[Tuple[int, str]] = []
+            try:
+                while True:
+                    item = await queue.get()
+                    if item is None:
+                        break
+                    batch.append(item)
+                    found_ids.append(item[0])
+                    if len(batch) >= _SYNC_BATCH_SIZE:
+                        await storage.bulk_upsert_known_chats(batch)
+                        batch = []
+                if batch:
+                    await storage.bulk_upsert_known_chats(batch)
+                await producer
+            finally:
+                if not producer.done():
+                    producer.cancel()
+            available_ids = set(found_ids)
             await storage.replace_delivery_ready_chat_ids(available_ids)
             return available_ids
 
+    async def iter_group_chats(self) -> AsyncIterator[Tuple[int, str]]:
+        """Yields (chat_id, title) for every group dialog as pages arrive."""
+        extract_group_id = self._extract_group_id
+        async for dialog in self._client.iter_dialogs(limit=self._dialogs_limit):
+            entity = dialog.entity
+            chat_id = extract_group_id(entity)
+            if chat_id is None:
+                continue
+            # Only Chat/Channel entities get here, so ``title`` always exists.
+            yield chat_id, entity.title or getattr(entity, "username", None) or f"Чат {chat_id}"
+
+    async def _fetch_dialogs_into(self, queue: "asyncio.Queue[Optional[Tuple[int, str]]]") -> None:
+        put = queue.put
+        try:
+            async for item in self.iter_group_chats():
+                await put(item)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            await queue.put(None)
+            raise
+        await queue.put(None)
+
     def _extract_group_id(self, entity: Optional[tl_types.TypePeer]) -> Optional[int]:
-        if entity is None:
-            return None
-        if isinstance(entity, tl_types.Channel):
-            if not getattr(entity, "megagroup", False) and not getattr(entity, "gigagroup", False):
+        entity_type = type(entity)
+        if entity_type is tl_types.Channel:
+            if not entity.megagroup and not entity.gigagroup:
                 return None
-        elif isinstance(entity, tl_types.Chat):
-            pass
-        else:
+        elif entity_type is not tl_types.Chat:
             return None
         try:
             return telethon_utils.get_peer_id(entity, add_mark=True)
@@ -1,22 +1,45 @@
 import asyncio
+import atexit
+import hashlib
+import hmac
+import io
 import logging
 import os
+import queue
+import re
+import ssl
 import time
+from collections import OrderedDict
 from datetime import datetime, timedelta
+from functools import lru_cache, partial
+from logging.handlers import QueueHandler, QueueListener
 from pathlib import Path
-from typing import Any, Awaitable, Callable, Dict, Optional, Set
+from typing import Any, Awaitable, Callable, Dict, FrozenSet, List, Optional, Set, Tuple
 
 from aiogram import Bot, Dispatcher, types
+from aiogram.dispatcher.webhook import WebhookRequestHandler
 from aiogram.contrib.fsm_storage.memory import MemoryStorage
+from aiogram.dispatcher.storage import BaseStorage
 from aiogram.dispatcher import FSMContext
-from aiogram.utils import exceptions, executor
+from aiogram.utils import exceptions, executor, json
 from aiogram.utils.markdown import hbold, quote_html
 from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup, InputFile
+import aiohttp
+import certifi
+from aiohttp import web
 from dotenv import load_dotenv
 
+try:
+    import uvloop
+except ImportError:  # pragma: no cover - not available on Windows
+    uvloop = None
+
 from app.auto_sender import AutoSender
+from app.edit_coalescer import EditCoalescer
 from app.keyboards import auto_menu_keyboard, groups_keyboard, main_menu_keyboard, inbox_reply_keyboard
-from app.pdf_reports import build_payments_pdf
+from app.middlewares import StorageCacheMiddleware
+from app.pdf_reports import render_payments_pdf_in_subprocess
+from app.rate_limit import RateLimiter
 from app.states import AutoCampaignStates, PaymentStates, AdminLoginStates, AdminManualPaymentStates, AdminInboxStates
 from app.storage import Storage
 from app.user_delivery import UserDelivery
@@ -24,8 +47,23 @@ from app.user_delivery import UserDelivery
 
 BASE_DIR = Path(__file__).resolve().parent
 load_dotenv(BASE_DIR / ".env")
-logging.basicConfig(level=logging.INFO)
+
+
+def configure_logging() -> None:
+    # Handlers only enqueue records; a listener thread does the blocking stderr writes.
+    log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    # basicConfig gives the QueueHandler its format, so records arrive pre-formatted.
+    listener = QueueListener(log_queue, logging.StreamHandler())
+    logging.basicConfig(level=logging.INFO, handlers=[QueueHandler(log_queue)])
+    listener.start()
+    atexit.register(listener.stop)
+
+
+configure_logging()
 logger = logging.getLogger(__name__)
+if uvloop is not None:
+    # Must run before aiogram or the executor create the event loop.
+    uvloop.install()
 
 BOT_TOKEN = os.getenv("BOT_TOKEN")
 if not BOT_TOKEN:
@@ -72,13 +110,74 @@ storage = create_storage()
 GROUP_CHAT_TYPES = {types.ChatType.GROUP, types.ChatType.SUPERGROUP}
 
 
+LAST_RENDER_CACHE_SIZE = 1024
+# Remembers this process's last render per message so identical re-renders skip the API call.
+# That only holds while one process sees every update and every edit goes through
+# safe_edit_text. Long polling guarantees the former (a second getUpdates consumer is
+# rejected, even with Redis FSM storage). Webhook mode may run several instances behind one
+# URL, so the cache is off there.
+RENDER_CACHE_ENABLED = not os.getenv("WEBHOOK_URL")
+_last_render: "OrderedDict[Tuple[int, int], int]" = OrderedDict()
+
+
+def _render_fingerprint(text: str, reply_markup: Any) -> int:
+    markup_json = reply_markup.as_json() if reply_markup is not None else None
+    return hash((text, markup_json))
+
+
+def _remember_render(key: Tuple[int, int], fingerprint: int) -> None:
+    if not RENDER_CACHE_ENABLED:
+        return
+    _last_render[key] = fingerprint
+    _last_render.move_to_end(key)
+    while len(_last_render) > LAST_RENDER_CACHE_SIZE:
+        _last_render.popitem(last=False)
+
+
+def forget_render(key: Tuple[int, int]) -> None:
+    # A superseded edit may leave the remembered render out of step with the message.
+    _last_render.pop(key, None)
+
+
 async def safe_edit_text(message: types.Message, text: str, **kwargs) -> None:
-    """Edit message but ignore Telegram 'message not modified' errors."""
+    """Edit message but skip unchanged renders and ignore 'message not modified' errors."""
+    key = (message.chat.id, message.message_id)
+    fingerprint = _render_fingerprint(text, kwargs.get("reply_markup"))
+    if _last_render.get(key) == fingerprint:
+        return
     try:
         await message.edit_text(text, **kwargs)
     except exceptions.MessageNotModified:
-        return
-bot = Bot(token=BOT_TOKEN, parse_mode=types.ParseMode.HTML)
+        pass
+    _remember_render(key, fingerprint)
+
+
+EDIT_COALESCE_SECONDS = 0.15
+BOT_KEEPALIVE_SECONDS = 60
+BOT_DNS_CACHE_SECONDS = 300
+edit_coalescer = EditCoalescer(safe_edit_text, delay=EDIT_COALESCE_SECONDS, on_superseded=forget_render)
+
+
+def schedule_edit_text(message: types.Message, text: str, **kwargs) -> None:
+    """Queue an edit; rapid re-renders of the same message collapse into the latest one."""
+    edit_coalescer.schedule((message.chat.id, message.message_id), message, text, **kwargs)
+
+
+class PooledBot(Bot):
+    """Keeps pooled Bot API connections and DNS answers alive between fan-out bursts."""
+
+    async def get_new_session(self) -> aiohttp.ClientSession:
+        # Mirrors aiogram's own session (uncapped pool, certifi CA bundle) plus the keep-alive settings.
+        connector = aiohttp.TCPConnector(
+            limit=0,
+            ssl=ssl.create_default_context(cafile=certifi.where()),
+            keepalive_timeout=BOT_KEEPALIVE_SECONDS,
+            ttl_dns_cache=BOT_DNS_CACHE_SECONDS,
+        )
+        return aiohttp.ClientSession(connector=connector, json_serialize=json.dumps)
+
+
+bot = PooledBot(token=BOT_TOKEN, parse_mode=types.ParseMode.HTML)
 tg_user_api_id = os.getenv("TG_USER_API_ID")
 tg_user_api_hash = os.getenv("TG_USER_API_HASH")
 tg_user_session = os.getenv("TG_USER_SESSION")
@@ -106,14 +205,51 @@ if api_id_value and tg_user_api_hash and tg_user_session:
         dialogs_limit=tg_user_dialogs_limit,
     )
 USE_USER_DELIVERY = user_delivery is not None
-dp = Dispatcher(bot, storage=MemoryStorage())
+
+
+def create_fsm_storage() -> BaseStorage:
+    redis_host = os.getenv("REDIS_HOST")
+    if not redis_host:
+        return MemoryStorage()
+    from aiogram.contrib.fsm_storage.redis import RedisStorage2
+
+    try:
+        redis_port = int(os.getenv("REDIS_PORT", "6379"))
+        redis_db = int(os.getenv("REDIS_DB", "0"))
+        redis_pool_size = int(os.getenv("REDIS_POOL_SIZE", "50"))
+    except ValueError as exc:
+        raise RuntimeError("REDIS_PORT, REDIS_DB and REDIS_POOL_SIZE must be integers.") from exc
+    logger.info("Используем Redis для состояний FSM (%s:%s/%s).", redis_host, redis_port, redis_db)
+    try:
+        # RedisStorage2 imports redis.asyncio in its constructor, not at module import.
+        return RedisStorage2(
+            host=redis_host,
+            port=redis_port,
+            db=redis_db,
+            password=os.getenv("REDIS_PASSWORD") or None,
+            pool_size=redis_pool_size,
+        )
+    except ImportError as exc:  # pragma: no cover - driver optional
+        raise RuntimeError("redis is required for REDIS_HOST FSM storage. Install redis.") from exc
+
+
+dp = Dispatcher(bot, storage=create_fsm_storage())
+dp.middleware.setup(StorageCacheMiddleware())
 
 bot["storage"] = storage
-bot["auto_sender"] = None  # filled on startup
 bot["user_delivery"] = user_delivery
+# Set in on_startup before polling begins; module globals keep hot handlers off bot[...] lookups.
+auto_sender: Optional[AutoSender] = None
+bot_id: Optional[int] = None
+
+
+DELIVERY_CHATS_FRESH_SECONDS = 15
+delivery_chats_synced_at = float("-inf")
+delivery_chats_sync_lock = asyncio.Lock()
 
 
 async def refresh_user_delivery_chats() -> None:
+    global delivery_chats_synced_at
     if not USE_USER_DELIVERY:
         return
     user_delivery_instance: Optional[UserDelivery] = bot.get("user_delivery")
@@ -123,6 +259,37 @@ async def refresh_user_delivery_chats() -> None:
         await user_delivery_instance.sync_known_chats(storage)
     except Exception:
         logger.exception("Не удалось обновить список чатов пользовательского клиента.")
+    else:
+        delivery_chats_synced_at = time.monotonic()
+
+
+async def refresh_user_delivery_chats_if_stale() -> None:
+    """Skips the dialog sync when one finished recently; concurrent taps share one sync."""
+    if time.monotonic() - delivery_chats_synced_at < DELIVERY_CHATS_FRESH_SECONDS:
+        return
+    async with delivery_chats_sync_lock:
+        if time.monotonic() - delivery_chats_synced_at >= DELIVERY_CHATS_FRESH_SECONDS:
+            await refresh_user_delivery_chats()
+
+
+DELIVERY_CHATS_REFRESH_SECONDS = 60
+delivery_chats_refresh_requested = asyncio.Event()
+delivery_chats_refresher: Optional["asyncio.Task[None]"] = None
+
+
+def request_delivery_chats_refresh() -> None:
+    """Wakes the background dialog sync; menus render from the last synced chat list."""
+    delivery_chats_refresh_requested.set()
+
+
+async def refresh_delivery_chats_periodically() -> None:
+    while True:
+        try:
+            await asyncio.wait_for(delivery_chats_refresh_requested.wait(), DELIVERY_CHATS_REFRESH_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+        delivery_chats_refresh_requested.clear()
+        await refresh_user_delivery_chats()
 
 PAYMENT_AMOUNT = 100_000
 PAYMENT_CURRENCY = "UZS"
@@ -135,6 +302,7 @@ PAYMENT_CARD_INVALID_MESSAGE = (
     "Номер карты должен содержать только 12–19 цифр. Пожалуйста, отправьте номер ещё раз.\n\n"
     f"{PAYMENT_CARD_PROMPT}"
 )
+NON_DIGIT_RE = re.compile(r"[^0-9]")
 PAYMENT_CARD_NAME_INVALID_MESSAGE = "Имя должно содержать минимум 3 символа. Попробуйте снова."
 PAYMENT_THANK_YOU_MESSAGE = (
     "Спасибо! Данные отправлены администратору. \n"
@@ -158,34 +326,68 @@ WELCOME_TEXT_USER = (
     "Если вы оператор, используйте команду /admin и введите код доступа."
 )
 
-STATIC_ADMIN_IDS: Set[int] = {
-    int(admin_id.strip())
-    for admin_id in os.getenv("ADMIN_IDS", "").split(",")
-    if admin_id.strip().isdigit()
-}
+STATIC_ADMIN_IDS: FrozenSet[int] = frozenset(
+    int(admin_id)
+    for raw_admin_id in os.getenv("ADMIN_IDS", "").split(",")
+    if (admin_id := raw_admin_id.strip()).isdigit()
+)
+# Admins promoted via /admin. Reloaded from storage at most every DYNAMIC_ADMINS_TTL_SECONDS
+# so promotions made by other bot instances are picked up; process_admin_code adds locally.
+DYNAMIC_ADMINS_TTL_SECONDS = 30
+dynamic_admin_ids: Set[int] = set()
+# Static and dynamic admins together; rebuilt only when the dynamic set changes.
+all_admin_ids: FrozenSet[int] = STATIC_ADMIN_IDS
+dynamic_admins_loaded_at = float("-inf")
+dynamic_admins_lock = asyncio.Lock()
 
 ADMIN_INVITE_CODE = os.getenv("ADMIN_CODE", "TW13")
 
+# Menus are immutable and only vary by role / campaign state, so build them once.
+MAIN_MENU_KEYBOARDS: Dict[bool, InlineKeyboardMarkup] = {
+    is_admin: main_menu_keyboard(is_admin, allow_group_pick=True) for is_admin in (False, True)
+}
+AUTO_MENU_KEYBOARDS: Dict[bool, InlineKeyboardMarkup] = {
+    is_enabled: auto_menu_keyboard(is_enabled=is_enabled, allow_group_pick=True)
+    for is_enabled in (False, True)
+}
+AUTO_MENU_HEADER = f"🛠 {hbold('Авторассылка')}\n\n"
+SETTINGS_MENU_HEADER = "⚙️ <b>Настройки рассылки</b>\n"
+
+
+async def load_dynamic_admin_ids() -> Set[int]:
+    global all_admin_ids, dynamic_admins_loaded_at
+    if time.monotonic() - dynamic_admins_loaded_at < DYNAMIC_ADMINS_TTL_SECONDS:
+        return dynamic_admin_ids
+    async with dynamic_admins_lock:
+        if time.monotonic() - dynamic_admins_loaded_at >= DYNAMIC_ADMINS_TTL_SECONDS:
+            admin_ids = await storage.list_admin_user_ids()
+            dynamic_admin_ids.clear()
+            dynamic_admin_ids.update(admin_ids)
+            all_admin_ids = STATIC_ADMIN_IDS | dynamic_admin_ids
+            dynamic_admins_loaded_at = time.monotonic()
+    return dynamic_admin_ids
+
 
 async def get_user_role(user_id: int) -> str:
-    if user_id in STATIC_ADMIN_IDS:
+    if await is_admin_user(user_id):
         return "admin"
     role = await storage.get_user_role(user_id)
     return role or "user"
 
 
-async def collect_admin_ids() -> Set[int]:
-    admins = set(STATIC_ADMIN_IDS)
-    dynamic = await storage.list_admin_user_ids()
-    admins.update(dynamic)
-    return admins
+def add_dynamic_admin(user_id: int) -> None:
+    global all_admin_ids
+    dynamic_admin_ids.add(user_id)
+    all_admin_ids = all_admin_ids | {user_id}
+
+
+async def collect_admin_ids() -> FrozenSet[int]:
+    await load_dynamic_admin_ids()
+    return all_admin_ids
 
 
 async def is_admin_user(user_id: int) -> bool:
-    if user_id in STATIC_ADMIN_IDS:
-        return True
-    role = await storage.get_user_role(user_id)
-    return role == "admin"
+    return user_id in STATIC_ADMIN_IDS or user_id in await load_dynamic_admin_ids()
 
 
 def format_currency(amount: int, currency: str) -> str:
@@ -193,15 +395,117 @@ def format_currency(amount: int, currency: str) -> str:
     return f"{formatted} {currency}"
 
 
+PAYMENT_AMOUNT_TEXT = format_currency(PAYMENT_AMOUNT, PAYMENT_CURRENCY)
+PAYMENT_START_TEXT = (
+    f"Для пополнения баланса: {PAYMENT_DESCRIPTION}.\n"
+    f"Сумма к оплате: {PAYMENT_AMOUNT_TEXT}.\n\n"
+    f"После подтверждения оплата действует {PAYMENT_VALID_DAYS} дней.\n\n"
+    f"Переведите сумму на карту <code>{PAYMENT_CARD_TARGET}</code> и введите номер своей карты ниже.\n\n"
+    f"{PAYMENT_CARD_PROMPT}"
+)
+PAYMENT_ADMIN_STATUS_LABELS = {
+    "pending": "В ожидании",
+    "approved": "Оплачен ✅",
+    "declined": "Не оплачен ❌",
+}
+PAYMENT_ACTION_STATUSES = {"approve": "approved", "decline": "declined"}
+# status -> (symbol, user history label, admin list label); one lookup per rendered row.
+PAYMENT_STATUS_DISPLAY = {
+    "approved": ("✅", "✅ Оплачено", "оплачено"),
+    "pending": ("⏳", "⏳ Ожидает подтверждения", "ожидает подтверждения"),
+    "declined": ("❌", "❌ Отклонено", "отклонено"),
+}
+PAYMENT_ADMIN_TEMPLATE = (
+    "💳 <b>Заявка на оплату</b>\n"
+    "ID заявки: <code>{request_id}</code>\n"
+    "Пользователь: {user_display}\n"
+    "ID пользователя: <code>{user_id}</code>\n"
+    f"Сумма: {PAYMENT_AMOUNT_TEXT}\n"
+    "Номер карты: <code>{card_number}</code>\n"
+    "Имя на карте: {card_name}\n"
+    "Статус: {status_text}"
+)
+
+
+@lru_cache(maxsize=256)
+def parse_iso_datetime(value: str) -> Optional[datetime]:
+    try:
+        return datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+
+
+@lru_cache(maxsize=256)
 def format_datetime(value: Optional[str]) -> str:
     if not value:
         return "—"
-    try:
-        return datetime.fromisoformat(value).strftime("%d.%m.%Y %H:%M")
-    except ValueError:
-        return value
+    parsed = parse_iso_datetime(value)
+    return parsed.strftime("%d.%m.%Y %H:%M") if parsed else value
+
+
+@lru_cache(maxsize=256)
+def format_payment_expiry(resolved_at: str) -> Optional[str]:
+    """Returns the dd.mm.yyyy date an approval made at ``resolved_at`` stays valid until."""
+    resolved_dt = parse_iso_datetime(resolved_at)
+    if resolved_dt is None:
+        return None
+    return (resolved_dt + timedelta(days=PAYMENT_VALID_DAYS)).strftime("%d.%m.%Y")
+
+
+HTML_SPECIAL_RE = re.compile(r"[&<>]")
+
+
+def escape_html(value: str) -> str:
+    """quote_html for one string, returning it as is when there is nothing to escape."""
+    return quote_html(value) if HTML_SPECIAL_RE.search(value) else value
+
+
+MESSAGE_PREVIEW_LIMIT = 180
+
+
+def message_preview(raw: Optional[str], limit: int = MESSAGE_PREVIEW_LIMIT) -> str:
+    """Truncates the campaign text before escaping so HTML entities are never cut."""
+    text = raw or "— не задано"
+    if len(text) > limit:
+        text = text[: limit - 3] + "..."
+    return escape_html(text)
 
 
+def summarize_targets(targets: List[int], known_chats: Dict[str, Dict[str, Any]]) -> Tuple[int, bool]:
+    """Returns how many known chats are deliverable and whether any selected target is not."""
+    available_ids = {info["chat_id"] for info in known_chats.values() if info.get("delivery_available")}
+    return len(available_ids), not available_ids.issuperset(targets)
+
+
+PAYMENT_EXPIRY_TTL_SECONDS = 30.0
+# (fresh_until, expiry) for the system payment; cleared by invalidate_payment_caches.
+system_payment_expiry: Optional[Tuple[float, Optional[str]]] = None
+
+
+async def load_payment_expiry() -> Optional[str]:
+    """Returns the dd.mm.yyyy expiry of the current system payment, or None if it lapsed."""
+    global system_payment_expiry
+    now = time.monotonic()
+    if system_payment_expiry and system_payment_expiry[0] > now:
+        return system_payment_expiry[1]
+    latest_payment, payment_valid = await storage.payment_snapshot(within_days=PAYMENT_VALID_DAYS)
+    expires: Optional[str] = None
+    if payment_valid and latest_payment:
+        expires = (latest_payment + timedelta(days=PAYMENT_VALID_DAYS)).strftime("%d.%m.%Y")
+    system_payment_expiry = (now + PAYMENT_EXPIRY_TTL_SECONDS, expires)
+    return expires
+
+
+def callback_args(data: Optional[str]) -> Optional[Tuple[str, str]]:
+    """Splits ``prefix:first:rest`` callback data into ``(first, rest)``."""
+    _, _, args = (data or "").partition(":")
+    first, separator, rest = args.partition(":")
+    if not separator:
+        return None
+    return first, rest
+
+
+@lru_cache(maxsize=1024)
 def payment_admin_keyboard(request_id: str) -> InlineKeyboardMarkup:
     keyboard = InlineKeyboardMarkup(row_width=2)
     keyboard.add(
@@ -211,6 +515,16 @@ def payment_admin_keyboard(request_id: str) -> InlineKeyboardMarkup:
     return keyboard
 
 
+@lru_cache(maxsize=1024)
+def manual_payment_keyboard(user_id: int) -> InlineKeyboardMarkup:
+    keyboard = InlineKeyboardMarkup(row_width=2)
+    keyboard.add(
+        InlineKeyboardButton("✅ Подтвердить", callback_data=f"manual_payment:approve:{user_id}"),
+        InlineKeyboardButton("❌ Не подтверждать", callback_data=f"manual_payment:decline:{user_id}"),
+    )
+    return keyboard
+
+
 def build_payment_admin_text(payment: Dict[str, Any]) -> str:
     user_display = payment.get("full_name") or "Неизвестный пользователь"
     username = payment.get("username")
@@ -219,36 +533,27 @@ def build_payment_admin_text(payment: Dict[str, Any]) -> str:
     card_number = payment.get("card_number") or "—"
     card_name = payment.get("card_name") or "—"
     status = payment.get("status", "pending")
-    status_map = {
-        "pending": "В ожидании",
-        "approved": "Оплачен ✅",
-        "declined": "Не оплачен ❌",
-    }
-    status_text = status_map.get(status, status)
     created_at = payment.get("created_at")
     resolved_at = payment.get("resolved_at")
     resolved_by = payment.get("resolved_by") or {}
     lines = [
-        "💳 <b>Заявка на оплату</b>",
-        f"ID заявки: <code>{payment.get('request_id')}</code>",
-        f"Пользователь: {quote_html(user_display)}",
-        f"ID пользователя: <code>{payment.get('user_id')}</code>",
-        f"Сумма: {format_currency(PAYMENT_AMOUNT, PAYMENT_CURRENCY)}",
-        f"Номер карты: <code>{card_number}</code>",
-        f"Имя на карте: {quote_html(card_name)}",
-        f"Статус: {status_text}",
+        PAYMENT_ADMIN_TEMPLATE.format(
+            request_id=payment.get("request_id"),
+            user_display=escape_html(user_display),
+            user_id=payment.get("user_id"),
+            card_number=card_number,
+            card_name=escape_html(card_name),
+            status_text=PAYMENT_ADMIN_STATUS_LABELS.get(status, status),
+        )
     ]
     if created_at:
-        lines.append(f"Создано: {quote_html(created_at)}")
+        lines.append(f"Создано: {escape_html(created_at)}")
     if resolved_at:
-        lines.append(f"Обновлено: {quote_html(resolved_at)}")
+        lines.append(f"Обновлено: {escape_html(resolved_at)}")
         if status == "approved":
-            try:
-                resolved_dt = datetime.fromisoformat(resolved_at)
-                expires_dt = resolved_dt + timedelta(days=PAYMENT_VALID_DAYS)
-                lines.append(f"Оплачено до: {expires_dt.strftime('%d.%m.%Y')}")
-            except ValueError:
-                pass
+            expires_on = format_payment_expiry(resolved_at)
+            if expires_on:
+                lines.append(f"Оплачено до: {expires_on}")
     if resolved_by:
         admin_info = resolved_by.get("admin_username")
         if admin_info:
@@ -265,26 +570,69 @@ async def send_payment_status_to_user(user_id: int, text: str) -> None:
         logger.warning("Не удалось отправить уведомление пользователю %s через бота: %s", user_id, exc)
 
 
+ADMIN_FANOUT_CONCURRENCY = 25
+# Telegram allows roughly 30 outgoing messages per second per bot.
+BOT_SEND_RATE_PER_SECOND = 30
+admin_fanout_semaphore = asyncio.Semaphore(ADMIN_FANOUT_CONCURRENCY)
+# Shared with AutoSender when campaigns go through the Bot API, so both stay under one budget.
+bot_send_limiter = RateLimiter(BOT_SEND_RATE_PER_SECOND, 1.0)
+
+
+async def send_with_flood_retry(request: Callable[[], Awaitable[Any]]) -> Any:
+    """Runs a Bot API request under the admin fan-out limits, retrying once after a flood wait."""
+    async with admin_fanout_semaphore:
+        try:
+            async with bot_send_limiter:
+                return await request()
+        except exceptions.RetryAfter as exc:
+            # Holding the slot while waiting slows the whole fan-out down, as Telegram asks.
+            await asyncio.sleep(exc.timeout)
+            async with bot_send_limiter:
+                return await request()
+
+
+# Strong references keep fire-and-forget tasks alive until they finish.
+background_tasks: Set["asyncio.Task[None]"] = set()
+
+
+async def _log_background_failure(coro: Awaitable[None], description: str) -> None:
+    try:
+        await coro
+    except Exception:
+        logger.exception(description)
+
+
+def run_in_background(coro: Awaitable[None], description: str) -> None:
+    task = asyncio.create_task(_log_background_failure(coro, description))
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+
+
+def acknowledge(call: types.CallbackQuery) -> None:
+    """Answers a callback query without making the handler's reply wait for it."""
+    run_in_background(call.answer(), "Не удалось ответить на callback-запрос.")
+
+
 async def notify_admins_about_payment(requester_id: int, request_id: str) -> None:
     payment = await storage.get_payment(request_id)
     if not payment:
         return
     admin_text = build_payment_admin_text(payment)
-    admin_ids = await collect_admin_ids()
-    requester_is_admin = await is_admin_user(requester_id)
-    for admin_id in admin_ids:
-        if admin_id == requester_id and not requester_is_admin:
-            continue
-        if not await is_admin_user(admin_id):
-            continue
-        try:
-            await bot.send_message(
-                admin_id,
-                admin_text,
-                reply_markup=payment_admin_keyboard(request_id),
-            )
-        except exceptions.TelegramAPIError as exc:
-            logger.error("Не удалось уведомить админа %s: %s", admin_id, exc)
+    # collect_admin_ids only returns admins, so a requester found there is an admin too.
+    recipients = list(await collect_admin_ids())
+    keyboard = payment_admin_keyboard(request_id)
+    results = await asyncio.gather(
+        *(
+            send_with_flood_retry(partial(bot.send_message, admin_id, admin_text, reply_markup=keyboard))
+            for admin_id in recipients
+        ),
+        return_exceptions=True,
+    )
+    for admin_id, result in zip(recipients, results):
+        if isinstance(result, exceptions.TelegramAPIError):
+            logger.error("Не удалось уведомить админа %s: %s", admin_id, result)
+        elif isinstance(result, BaseException):
+            raise result
 
 
 async def notify_admins_about_incoming_message(message: types.Message) -> bool:
@@ -296,14 +644,14 @@ async def notify_admins_about_incoming_message(message: types.Message) -> bool:
     admin_ids = await collect_admin_ids()
     if not admin_ids:
         return False
-    full_name = quote_html(user.full_name or "Неизвестный пользователь")
+    full_name = escape_html(user.full_name or "Неизвестный пользователь")
     username = f"@{user.username}" if user.username else "—"
     preview = message.text or message.caption or ""
     preview = preview.strip()
     if preview:
         if len(preview) > 600:
             preview = preview[:597] + "..."
-        preview = quote_html(preview)
+        preview = escape_html(preview)
     header_lines = [
         "📥 <b>Новое обращение</b>",
         f"Имя: {full_name}",
@@ -315,16 +663,14 @@ async def notify_admins_about_incoming_message(message: types.Message) -> bool:
     header_lines.append("Нажмите «Ответить», чтобы ответить пользователю.")
     header = "\n".join(header_lines)
     keyboard = inbox_reply_keyboard(user.id)
-    delivered = False
-    for admin_id in admin_ids:
-        if admin_id == user.id:
-            continue
-        if not await is_admin_user(admin_id):
-            continue
+
+    async def deliver(admin_id: int) -> bool:
+        # The header must precede the forwarded message, so each admin gets both in order.
         try:
-            await bot.send_message(admin_id, header, reply_markup=keyboard)
-            await bot.forward_message(admin_id, message.chat.id, message.message_id)
-            delivered = True
+            await send_with_flood_retry(partial(bot.send_message, admin_id, header, reply_markup=keyboard))
+            await send_with_flood_retry(
+                partial(bot.forward_message, admin_id, message.chat.id, message.message_id)
+            )
         except exceptions.TelegramAPIError as exc:
             logger.warning(
                 "Не удалось переслать сообщение пользователя %s админу %s: %s",
@@ -332,98 +678,119 @@ async def notify_admins_about_incoming_message(message: types.Message) -> bool:
                 admin_id,
                 exc,
             )
-    return delivered
+            return False
+        return True
+
+    results = await asyncio.gather(*(deliver(admin_id) for admin_id in admin_ids if admin_id != user.id))
+    return any(results)
 
 
 def build_user_payment_status_message(status: str, resolved_at: Optional[str]) -> str:
     if status == "approved":
         expires_text = ""
-        if resolved_at:
-            try:
-                resolved_dt = datetime.fromisoformat(resolved_at)
-                expires_dt = resolved_dt + timedelta(days=PAYMENT_VALID_DAYS)
-                expires_text = f" Оплата активна до {expires_dt.strftime('%d.%m.%Y')} включительно."
-            except ValueError:
-                expires_text = ""
+        expires_on = format_payment_expiry(resolved_at) if resolved_at else None
+        if expires_on:
+            expires_text = f" Оплата активна до {expires_on} включительно."
         return "✅ Администратор подтвердил оплату. Спасибо!" + expires_text
     if status == "declined":
         return "❌ Администратор отклонил оплату. Свяжитесь с поддержкой."
     return "Статус оплаты обновлён."
 
 
-async def build_user_payment_history_text(user_id: int) -> str:
-    payments = await storage.get_user_payments(user_id)
-    lines = ["📜 <b>История оплат</b>"]
-    if not payments:
-        lines.append("У вас ещё нет заявок на оплату.")
-        return "\n".join(lines)
+PAYMENT_TEXT_TTL_SECONDS = 5.0
+PAYMENT_TEXT_CACHE_SIZE = 1024
+# Rendered payment lists keyed by ("admin", limit) / ("user", user_id): (expires_at, text).
+payment_text_cache: Dict[Tuple[str, int], Tuple[float, str]] = {}
 
-    status_map = {
-        "approved": "✅ Оплачено",
-        "pending": "⏳ Ожидает подтверждения",
-        "declined": "❌ Отклонено",
-    }
-    for payment in payments[:20]:
-        status = payment.get("status")
-        symbol = {"approved": "✅", "pending": "⏳", "declined": "❌"}.get(status, "•")
-        created = format_datetime(payment.get("created_at"))
-        lines.append(f"{symbol} {created} — {status_map.get(status, status)}")
-        if status == "approved":
-            resolved_at = payment.get("resolved_at")
-            if resolved_at:
-                try:
-                    expires_dt = datetime.fromisoformat(resolved_at) + timedelta(days=PAYMENT_VALID_DAYS)
-                    lines.append(f"     Активна до: {expires_dt.strftime('%d.%m.%Y')}")
-                except ValueError:
-                    pass
-        card_number = payment.get("card_number")
-        if card_number:
-            lines.append(f"     Карта: {card_number}")
-    return "\n".join(lines)
+
+def invalidate_payment_caches() -> None:
+    global system_payment_expiry
+    payment_text_cache.clear()
+    system_payment_expiry = None
+
+
+async def cached_payment_text(key: Tuple[str, int], render: Callable[[], Awaitable[str]]) -> str:
+    now = time.monotonic()
+    cached = payment_text_cache.get(key)
+    if cached and cached[0] > now:
+        return cached[1]
+    text = await render()
+    if len(payment_text_cache) >= PAYMENT_TEXT_CACHE_SIZE:
+        for stale_key in [k for k, (expires_at, _) in payment_text_cache.items() if expires_at <= now]:
+            del payment_text_cache[stale_key]
+    payment_text_cache[key] = (now + PAYMENT_TEXT_TTL_SECONDS, text)
+    return text
+
+
+async def build_user_payment_history_text(user_id: int) -> str:
+    return await cached_payment_text(("user", user_id), lambda: render_user_payment_history_text(user_id))
 
 
 async def build_admin_payments_text(limit: int = 50) -> str:
-    payments = await storage.get_all_payments()
+    return await cached_payment_text(("admin", limit), lambda: render_admin_payments_text(limit))
+
+
+def format_user_payment_entry(payment: Dict[str, Any]) -> str:
+    get = payment.get
+    status = get("status")
+    symbol, status_name, _ = PAYMENT_STATUS_DISPLAY.get(status) or ("•", status, status)
+    entry = f"{symbol} {format_datetime(get('created_at'))} — {status_name}"
+    if status == "approved":
+        resolved_at = get("resolved_at")
+        expires_on = format_payment_expiry(resolved_at) if resolved_at else None
+        if expires_on:
+            entry += f"\n     Активна до: {expires_on}"
+    card_number = get("card_number")
+    if card_number:
+        entry += f"\n     Карта: {card_number}"
+    return entry
+
+
+def format_admin_payment_entry(payment: Dict[str, Any]) -> str:
+    get = payment.get
+    status = get("status")
+    symbol, _, status_name = PAYMENT_STATUS_DISPLAY.get(status) or ("•", status, status)
+    created = format_datetime(get("created_at"))
+    resolved_at = get("resolved_at")
+    expires_text = ""
+    if status == "approved" and resolved_at:
+        expires_on = format_payment_expiry(resolved_at)
+        if expires_on:
+            expires_text = f", до {expires_on}"
+    full_name = get("full_name") or "—"
+    username = get("username")
+    user_display = full_name
+    if username:
+        user_display += f" (@{username})"
+    card_number = get("card_number") or "—"
+    return (
+        f"{symbol} {user_display}\n"
+        f"     Карта: {card_number}\n"
+        f"     Статус: {status_name} ({created}{expires_text})"
+    )
+
+
+USER_PAYMENT_HISTORY_LIMIT = 20
+
+
+async def render_user_payment_history_text(user_id: int) -> str:
+    payments = await storage.get_user_payments(user_id, limit=USER_PAYMENT_HISTORY_LIMIT)
     if not payments:
-        return "📜 Пока нет заявок на оплату."
+        return "📜 <b>История оплат</b>\nУ вас ещё нет заявок на оплату."
+    return "\n".join(("📜 <b>История оплат</b>", *map(format_user_payment_entry, payments)))
 
-    lines = ["📜 <b>Список оплат</b>"]
-    for payment in payments[:limit]:
-        status = payment.get("status")
-        symbol = {"approved": "✅", "pending": "⏳", "declined": "❌"}.get(status, "•")
-        created = format_datetime(payment.get("created_at"))
-        resolved_at = payment.get("resolved_at")
-        expires_text = ""
-        if status == "approved" and resolved_at:
-            try:
-                expires_dt = datetime.fromisoformat(resolved_at) + timedelta(days=PAYMENT_VALID_DAYS)
-                expires_text = f", до {expires_dt.strftime('%d.%m.%Y')}"
-            except ValueError:
-                pass
-        full_name = payment.get("full_name") or "—"
-        username = payment.get("username")
-        user_display = full_name
-        if username:
-            user_display += f" (@{username})"
-        card_number = payment.get("card_number") or "—"
-        status_name = {
-            "approved": "оплачено",
-            "pending": "ожидает подтверждения",
-            "declined": "отклонено",
-        }.get(status, status)
-        lines.append(
-            f"{symbol} {user_display}\n"
-            f"     Карта: {card_number}\n"
-            f"     Статус: {status_name} ({created}{expires_text})"
-        )
-    return "\n".join(lines)
+
+async def render_admin_payments_text(limit: int = 50) -> str:
+    payments = await storage.get_all_payments(limit=limit)
+    if not payments:
+        return "📜 Пока нет заявок на оплату."
+    return "\n".join(("📜 <b>Список оплат</b>", *map(format_admin_payment_entry, payments)))
 
 
 async def build_main_menu(user_id: int) -> tuple[str, InlineKeyboardMarkup, bool]:
     is_admin = await is_admin_user(user_id)
-    allow_group_pick = True
     text = WELCOME_TEXT_ADMIN if is_admin else WELCOME_TEXT_USER
-    return text, main_menu_keyboard(is_admin, allow_group_pick=allow_group_pick), is_admin
+    return text, MAIN_MENU_KEYBOARDS[is_admin], is_admin
 
 
 async def send_main_menu(message: types.Message, *, edit: bool = False, user_id: Optional[int] = None) -> None:
@@ -436,27 +803,28 @@ async def send_main_menu(message: types.Message, *, edit: bool = False, user_id:
 
 
 async def show_auto_menu(message: types.Message, auto_data: dict, *, user_id: Optional[int] = None) -> None:
-    if USE_USER_DELIVERY:
-        await refresh_user_delivery_chats()
+    request_delivery_chats_refresh()
     status = "Активна ✅" if auto_data.get("is_enabled") else "Не запущена"
-    message_preview_raw = auto_data.get("message") or "— не задано"
-    if len(message_preview_raw) > 180:
-        message_preview_raw = message_preview_raw[:177] + "..."
-    message_preview = quote_html(message_preview_raw)
-    if len(message_preview) > 180:
-        message_preview = message_preview[:177] + "..."
+    preview = message_preview(auto_data.get("message"))
     interval = auto_data.get("interval_minutes") or 0
     targets = auto_data.get("target_chat_ids") or []
-    known_chats = await storage.list_known_chats()
-    available_total = sum(1 for info in known_chats.values() if info.get("delivery_available"))
+    personal_reads = (
+        (
+            is_admin_user(user_id),
+            storage.user_payment_snapshot(user_id, within_days=PAYMENT_VALID_DAYS),
+        )
+        if user_id is not None
+        else ()
+    )
+    known_chats, system_expires, *personal_state = await asyncio.gather(
+        storage.list_known_chats(),
+        load_payment_expiry(),
+        *personal_reads,
+    )
+    available_total, has_missing = summarize_targets(targets, known_chats)
     agent_name = "пользователя рассылки" if USE_USER_DELIVERY else "бота"
     if targets:
-        missing = [
-            chat_id
-            for chat_id in targets
-            if str(chat_id) not in known_chats or not known_chats[str(chat_id)].get("delivery_available")
-        ]
-        if missing:
+        if has_missing:
             group_line = (
                 f"⚠️ Выбрано групп: {len(targets)}. "
                 f"Добавьте {agent_name} во все выбранные чаты."
@@ -468,20 +836,15 @@ async def show_auto_menu(message: types.Message, auto_data: dict, *, user_id: Op
             group_line = f"Группы не выбраны (доступно {available_total})"
         else:
             group_line = f"Нет доступных групп: добавьте {agent_name} в рабочие чаты."
-    system_payment_valid = await storage.has_recent_payment(within_days=PAYMENT_VALID_DAYS)
-    latest_payment = await storage.latest_payment_timestamp()
-    if system_payment_valid and latest_payment:
-        expires_dt = latest_payment + timedelta(days=PAYMENT_VALID_DAYS)
-        system_payment_line = f"Общая оплата: действительна до {expires_dt.strftime('%d.%m.%Y')} ✅"
+    if system_expires:
+        system_payment_line = f"Общая оплата: действительна до {system_expires} ✅"
     else:
         system_payment_line = f"Общая оплата: требуется пополнение (каждые {PAYMENT_VALID_DAYS} дней)"
     payment_lines = []
     is_admin = None
     if user_id is not None:
-        is_admin = await is_admin_user(user_id)
-        personal_valid = await storage.has_recent_payment_for_user(user_id, within_days=PAYMENT_VALID_DAYS)
+        is_admin, (personal_ts, personal_valid) = personal_state
         if personal_valid:
-            personal_ts = await storage.latest_payment_timestamp_for_user(user_id)
             if personal_ts:
                 personal_expires = personal_ts + timedelta(days=PAYMENT_VALID_DAYS)
                 payment_lines.append(f"Ваша оплата: активна до {personal_expires.strftime('%d.%m.%Y')} ✅")
@@ -495,22 +858,22 @@ async def show_auto_menu(message: types.Message, auto_data: dict, *, user_id: Op
     if is_admin or user_id is None:
         payment_lines.append(system_payment_line)
     payment_line = "\n".join(payment_lines) if payment_lines else system_payment_line
-    allow_group_pick = True
-    text = (
-        f"🛠 {hbold('Авторассылка')}\n\n"
-        f"Статус: {status}\n"
-        f"Интервал: {interval} мин\n"
-        f"{group_line}\n\n"
-        f"{payment_line}\n\n"
-        f"Сообщение:\n{message_preview}"
+    text = AUTO_MENU_HEADER + "\n".join(
+        (
+            f"Статус: {status}",
+            f"Интервал: {interval} мин",
+            group_line,
+            "",
+            payment_line,
+            "",
+            "Сообщение:",
+            preview,
+        )
     )
     await safe_edit_text(
         message,
         text,
-        reply_markup=auto_menu_keyboard(
-            is_enabled=auto_data.get("is_enabled"),
-            allow_group_pick=allow_group_pick,
-        ),
+        reply_markup=AUTO_MENU_KEYBOARDS[bool(auto_data.get("is_enabled"))],
     )
 
 
@@ -571,40 +934,37 @@ async def process_admin_code(message: types.Message, state: FSMContext) -> None:
         await message.reply("Неверный код. Попробуйте снова или используйте /cancel.")
         return
     await storage.set_user_role(message.from_user.id, "admin")
+    add_dynamic_admin(message.from_user.id)
     await state.finish()
     await message.answer("Статус администратора активирован.")
     await send_main_menu(message)
 
 
-@dp.callback_query_handler(lambda c: c.data == "main:auto")
-async def cb_main_auto(call: types.CallbackQuery) -> None:
-    await call.answer()
+async def cb_main_auto(call: types.CallbackQuery, state: FSMContext) -> None:
+    acknowledge(call)
     auto_data = await storage.get_auto(call.from_user.id)
     await show_auto_menu(call.message, auto_data, user_id=call.from_user.id)
 
 
-@dp.callback_query_handler(lambda c: c.data == "main:stats")
-async def cb_main_stats(call: types.CallbackQuery) -> None:
+async def cb_main_stats(call: types.CallbackQuery, state: FSMContext) -> None:
     if not await is_admin_user(call.from_user.id):
         await call.answer("Доступно только администраторам.", show_alert=True)
         return
-    await call.answer()
-    auto = await storage.get_auto()
+    acknowledge(call)
+    auto, (latest_payment, payment_valid) = await asyncio.gather(
+        storage.get_auto(),
+        storage.payment_snapshot(within_days=PAYMENT_VALID_DAYS),
+    )
     stats = auto.get("stats") or {}
     campaigns_total = auto.get("campaigns_total", 0)
     campaigns_active = auto.get("campaigns_active", 0)
     sent_total = stats.get("sent_total", 0)
     last_sent_at = stats.get("last_sent_at")
     last_error = stats.get("last_error")
-    latest_payment = await storage.latest_payment_timestamp()
-    payment_valid = await storage.has_recent_payment(within_days=PAYMENT_VALID_DAYS)
     human_time = "—"
     if last_sent_at:
-        try:
-            dt = datetime.fromisoformat(last_sent_at)
-            human_time = dt.strftime("%d.%m.%Y %H:%M:%S")
-        except ValueError:
-            human_time = last_sent_at
+        dt = parse_iso_datetime(last_sent_at)
+        human_time = dt.strftime("%d.%m.%Y %H:%M:%S") if dt else last_sent_at
     if latest_payment:
         payment_due = latest_payment + timedelta(days=PAYMENT_VALID_DAYS)
         payment_line = (
@@ -630,15 +990,13 @@ async def cb_main_stats(call: types.CallbackQuery) -> None:
     await safe_edit_text(call.message, "\n".join(lines), reply_markup=keyboard)
 
 
-@dp.callback_query_handler(lambda c: c.data == "main:groups")
-async def cb_main_groups(call: types.CallbackQuery) -> None:
+async def cb_main_groups(call: types.CallbackQuery, state: FSMContext) -> None:
     if not await is_admin_user(call.from_user.id):
         await call.answer("Доступно только администраторам.", show_alert=True)
         return
-    await call.answer()
-    await refresh_user_delivery_chats()
-    known = await storage.list_known_chats()
-    auto = await storage.get_auto(call.from_user.id)
+    acknowledge(call)
+    request_delivery_chats_refresh()
+    known, auto = await asyncio.gather(storage.list_known_chats(), storage.get_auto(call.from_user.id))
     selected = auto.get("target_chat_ids") or []
     if not known:
         delivery_subject = "пользователя рассылки" if USE_USER_DELIVERY else "бота"
@@ -663,29 +1021,26 @@ async def cb_main_groups(call: types.CallbackQuery) -> None:
     )
 
 
-@dp.callback_query_handler(lambda c: c.data == "main:settings")
-async def cb_main_settings(call: types.CallbackQuery) -> None:
+async def cb_main_settings(call: types.CallbackQuery, state: FSMContext) -> None:
     if not await is_admin_user(call.from_user.id):
         await call.answer("Доступно только администраторам.", show_alert=True)
         return
-    await call.answer()
-    await refresh_user_delivery_chats()
-    auto = await storage.get_auto(call.from_user.id)
+    acknowledge(call)
+    request_delivery_chats_refresh()
+    auto, known_chats, expires = await asyncio.gather(
+        storage.get_auto(call.from_user.id),
+        storage.list_known_chats(),
+        load_payment_expiry(),
+    )
     interval = auto.get("interval_minutes")
-    message_text_raw = auto.get("message") or "— не задано"
-    message_text = quote_html(message_text_raw)
+    # Settings show the whole campaign text; only the auto menu uses the short preview.
+    message_text = escape_html(auto.get("message") or "— не задано")
     status = "Активна" if auto.get("is_enabled") else "Отключена"
     targets = auto.get("target_chat_ids") or []
-    known_chats = await storage.list_known_chats()
-    available_total = sum(1 for info in known_chats.values() if info.get("delivery_available"))
+    available_total, has_missing = summarize_targets(targets, known_chats)
     agent_name = "пользователя рассылки" if USE_USER_DELIVERY else "бота"
     if targets:
-        missing = [
-            chat_id
-            for chat_id in targets
-            if str(chat_id) not in known_chats or not known_chats[str(chat_id)].get("delivery_available")
-        ]
-        if missing:
+        if has_missing:
             group_line = f"Группы: выбраны недоступные чаты — добавьте {agent_name}."
         else:
             group_line = f"Группы: {len(targets)} выбрано (доступно {available_total})"
@@ -694,33 +1049,33 @@ async def cb_main_settings(call: types.CallbackQuery) -> None:
             group_line = f"Группы: не выбраны (доступно {available_total})"
         else:
             group_line = f"Группы: нет доступных чатов — добавьте {agent_name}."
-    payment_valid = await storage.has_recent_payment(within_days=PAYMENT_VALID_DAYS)
-    latest_payment = await storage.latest_payment_timestamp()
-    if payment_valid and latest_payment:
-        expires_dt = latest_payment + timedelta(days=PAYMENT_VALID_DAYS)
-        payment_line = f"Оплата: действительна до {expires_dt.strftime('%d.%m.%Y')} ✅"
+    if expires:
+        payment_line = f"Оплата: действительна до {expires} ✅"
     else:
         payment_line = f"Оплата: требуется пополнение (каждые {PAYMENT_VALID_DAYS} дней)"
-    text = (
-        "⚙️ <b>Настройки рассылки</b>\n"
-        f"Статус: {status}\n"
-        f"Интервал: {interval} мин\n"
-        f"{group_line}\n"
-        f"{payment_line}\n\n"
-        f"Сообщение:\n{message_text}"
+    text = SETTINGS_MENU_HEADER + "\n".join(
+        (
+            f"Статус: {status}",
+            f"Интервал: {interval} мин",
+            group_line,
+            payment_line,
+            "",
+            "Сообщение:",
+            message_text,
+        )
     )
     _, keyboard, _ = await build_main_menu(call.from_user.id)
     await safe_edit_text(call.message, text, reply_markup=keyboard)
 
 
-@dp.callback_query_handler(lambda c: c.data == "main:pay")
 async def cb_main_pay(call: types.CallbackQuery, state: FSMContext) -> None:
-    await call.answer()
+    acknowledge(call)
     admin_ids = await collect_admin_ids()
+    is_self_admin = await is_admin_user(call.from_user.id)
     eligible_admin_ids = {
         admin_id
         for admin_id in admin_ids
-        if admin_id != call.from_user.id or await is_admin_user(call.from_user.id)
+        if admin_id != call.from_user.id or is_self_admin
     }
     if not eligible_admin_ids:
         await call.message.answer(
@@ -729,41 +1084,31 @@ async def cb_main_pay(call: types.CallbackQuery, state: FSMContext) -> None:
         return
     await state.finish()
     await PaymentStates.waiting_for_card_number.set()
-    await call.message.answer(
-        f"Для пополнения баланса: {PAYMENT_DESCRIPTION}.\n"
-        f"Сумма к оплате: {format_currency(PAYMENT_AMOUNT, PAYMENT_CURRENCY)}.\n\n"
-        f"После подтверждения оплата действует {PAYMENT_VALID_DAYS} дней.\n\n"
-        f"Переведите сумму на карту <code>{PAYMENT_CARD_TARGET}</code> и введите номер своей карты ниже.\n\n"
-        f"{PAYMENT_CARD_PROMPT}",
-        disable_web_page_preview=True,
-    )
+    await call.message.answer(PAYMENT_START_TEXT, disable_web_page_preview=True)
 
 
-@dp.callback_query_handler(lambda c: c.data == "main:user_payments")
-async def cb_main_user_payments(call: types.CallbackQuery) -> None:
-    await call.answer()
+async def cb_main_user_payments(call: types.CallbackQuery, state: FSMContext) -> None:
+    acknowledge(call)
     text = await build_user_payment_history_text(call.from_user.id)
     _, keyboard, _ = await build_main_menu(call.from_user.id)
     await safe_edit_text(call.message, text, reply_markup=keyboard)
 
 
-@dp.callback_query_handler(lambda c: c.data == "main:admin_payments")
-async def cb_main_admin_payments(call: types.CallbackQuery) -> None:
+async def cb_main_admin_payments(call: types.CallbackQuery, state: FSMContext) -> None:
     if not await is_admin_user(call.from_user.id):
         await call.answer("Доступно только администраторам.", show_alert=True)
         return
-    await call.answer()
+    acknowledge(call)
     text = await build_admin_payments_text()
     _, keyboard, _ = await build_main_menu(call.from_user.id)
     await safe_edit_text(call.message, text, reply_markup=keyboard)
 
 
-@dp.callback_query_handler(lambda c: c.data == "main:manual_payment")
 async def cb_main_manual_payment(call: types.CallbackQuery, state: FSMContext) -> None:
     if not await is_admin_user(call.from_user.id):
         await call.answer("Доступно только администраторам.", show_alert=True)
         return
-    await call.answer()
+    acknowledge(call)
     await AdminManualPaymentStates.waiting_for_user.set()
     await call.message.answer(
         "Введите Telegram ID или @username пользователя, чтобы перепроверить оплату.\n"
@@ -771,15 +1116,13 @@ async def cb_main_manual_payment(call: types.CallbackQuery, state: FSMContext) -
     )
 
 
-@dp.callback_query_handler(lambda c: c.data == "auto:back")
-async def cb_auto_back(call: types.CallbackQuery) -> None:
-    await call.answer()
+async def cb_auto_back(call: types.CallbackQuery, state: FSMContext) -> None:
+    acknowledge(call)
     await send_main_menu(call.message, edit=True, user_id=call.from_user.id)
 
 
-@dp.callback_query_handler(lambda c: c.data == "auto:set_message")
 async def cb_auto_set_message(call: types.CallbackQuery, state: FSMContext) -> None:
-    await call.answer()
+    acknowledge(call)
     await AutoCampaignStates.waiting_for_message.set()
     await call.message.answer(
         "Отправьте новый текст сообщения для авторассылки.\n"
@@ -793,25 +1136,18 @@ async def process_auto_message(message: types.Message, state: FSMContext) -> Non
     if not text:
         await message.reply("Сообщение не может быть пустым. Попробуйте снова.")
         return
-    await storage.set_auto_message(message.from_user.id, text)
-    await storage.ensure_constraints(message.from_user.id)
-    auto_sender: AutoSender = message.bot["auto_sender"]
-    await auto_sender.refresh(owner_id=message.from_user.id)
+    auto_data = await storage.set_auto_message(message.from_user.id, text)
+    auto_sender.schedule_refresh(message.from_user.id)
     await state.finish()
     await message.answer("Сообщение сохранено.")
-    auto_data = await storage.get_auto(message.from_user.id)
     await message.answer(
         "Параметры авторассылки обновлены.",
-        reply_markup=auto_menu_keyboard(
-            is_enabled=auto_data.get("is_enabled"),
-            allow_group_pick=True,
-        ),
+        reply_markup=AUTO_MENU_KEYBOARDS[bool(auto_data.get("is_enabled"))],
     )
 
 
-@dp.callback_query_handler(lambda c: c.data == "auto:set_interval")
 async def cb_auto_set_interval(call: types.CallbackQuery, state: FSMContext) -> None:
-    await call.answer()
+    acknowledge(call)
     await AutoCampaignStates.waiting_for_interval.set()
     await call.message.answer(
         "Укажите интервал рассылки в минутах (целое число > 0).\n"
@@ -829,19 +1165,13 @@ async def process_auto_interval(message: types.Message, state: FSMContext) -> No
     if minutes <= 0:
         await message.reply("Интервал должен быть больше нуля.")
         return
-    await storage.set_auto_interval(message.from_user.id, minutes)
-    await storage.ensure_constraints(message.from_user.id)
-    auto_sender: AutoSender = message.bot["auto_sender"]
-    await auto_sender.refresh(owner_id=message.from_user.id)
+    auto_data = await storage.set_auto_interval(message.from_user.id, minutes)
+    auto_sender.schedule_refresh(message.from_user.id)
     await state.finish()
     await message.answer(f"Интервал установлен: {minutes} мин.")
-    auto_data = await storage.get_auto(message.from_user.id)
     await message.answer(
         "Параметры авторассылки обновлены.",
-        reply_markup=auto_menu_keyboard(
-            is_enabled=auto_data.get("is_enabled"),
-            allow_group_pick=True,
-        ),
+        reply_markup=AUTO_MENU_KEYBOARDS[bool(auto_data.get("is_enabled"))],
     )
 
 
@@ -876,18 +1206,13 @@ async def process_manual_payment_user(message: types.Message, state: FSMContext)
     else:
         info_lines.append("Ранее оплаты не найдены.")
     info_lines.append("Выберите результат перепроверки:")
-    keyboard = InlineKeyboardMarkup(row_width=2)
-    keyboard.add(
-        InlineKeyboardButton("✅ Подтвердить", callback_data=f"manual_payment:approve:{user_id}"),
-        InlineKeyboardButton("❌ Не подтверждать", callback_data=f"manual_payment:decline:{user_id}"),
-    )
     await state.finish()
-    await message.answer("\n".join(info_lines), reply_markup=keyboard)
+    await message.answer("\n".join(info_lines), reply_markup=manual_payment_keyboard(user_id))
 
 
 @dp.message_handler(state=PaymentStates.waiting_for_card_number, content_types=types.ContentTypes.TEXT)
 async def process_payment_card_number(message: types.Message, state: FSMContext) -> None:
-    digits = "".join(filter(str.isdigit, message.text or ""))
+    digits = NON_DIGIT_RE.sub("", message.text or "")
     if len(digits) < 12 or len(digits) > 19:
         await message.reply(PAYMENT_CARD_INVALID_MESSAGE)
         return
@@ -917,17 +1242,19 @@ async def process_payment_card_name(message: types.Message, state: FSMContext) -
         card_number=card_number,
         card_name=card_name,
     )
-    await notify_admins_about_payment(user.id, request_id)
+    invalidate_payment_caches()
+    run_in_background(
+        notify_admins_about_payment(user.id, request_id),
+        f"Не удалось уведомить админов о заявке {request_id}.",
+    )
     await message.answer(PAYMENT_THANK_YOU_MESSAGE)
     await state.finish()
 
 
-@dp.callback_query_handler(lambda c: c.data == "auto:pick_groups")
-async def cb_auto_pick_groups(call: types.CallbackQuery) -> None:
-    await call.answer()
-    await refresh_user_delivery_chats()
-    known = await storage.list_known_chats()
-    auto = await storage.get_auto(call.from_user.id)
+async def cb_auto_pick_groups(call: types.CallbackQuery, state: FSMContext) -> None:
+    acknowledge(call)
+    request_delivery_chats_refresh()
+    known, auto = await asyncio.gather(storage.list_known_chats(), storage.get_auto(call.from_user.id))
     selected = auto.get("target_chat_ids") or []
     if not known:
         delivery_subject = "пользователя рассылки" if USE_USER_DELIVERY else "бота"
@@ -954,14 +1281,13 @@ async def cb_auto_pick_groups(call: types.CallbackQuery) -> None:
     )
 
 
-@dp.callback_query_handler(lambda c: c.data.startswith("group:"))
-async def cb_group_toggle(call: types.CallbackQuery) -> None:
+async def cb_group_toggle(call: types.CallbackQuery, state: FSMContext) -> None:
     await call.answer()
-    try:
-        _, origin, action_raw = call.data.split(":", maxsplit=2)
-    except ValueError:
+    args = callback_args(call.data)
+    if args is None:
         await call.answer("Неизвестная команда", show_alert=True)
         return
+    origin, action_raw = args
     action_parts = action_raw.split("|")
     action = action_parts[0]
     page = 0
@@ -974,6 +1300,8 @@ async def cb_group_toggle(call: types.CallbackQuery) -> None:
     if len(action_parts) > 2:
         mode = action_parts[2]
     if action == "done":
+        # A queued or in-flight toggle re-render must not overwrite the menu shown below.
+        await edit_coalescer.discard_and_wait((call.message.chat.id, call.message.message_id))
         if origin == "main":
             await send_main_menu(call.message, edit=True, user_id=call.from_user.id)
         else:
@@ -984,9 +1312,8 @@ async def cb_group_toggle(call: types.CallbackQuery) -> None:
         await call.answer()
         return
     if action == "page":
-        known = await storage.list_known_chats()
-        auto = await storage.get_auto(call.from_user.id)
-        await safe_edit_text(
+        known, auto = await asyncio.gather(storage.list_known_chats(), storage.get_auto(call.from_user.id))
+        schedule_edit_text(
             call.message,
             call.message.text or "",
             reply_markup=groups_keyboard(known, auto.get("target_chat_ids"), origin=origin, page=page),
@@ -1016,10 +1343,10 @@ async def cb_group_toggle(call: types.CallbackQuery) -> None:
         else:
             clear_all = all_selected
         if clear_all:
-            await storage.set_target_chats(call.from_user.id, [])
+            auto = await storage.set_target_chats(call.from_user.id, [])
             update_message = "Все чаты убраны из списка рассылки."
         else:
-            await storage.set_target_chats(call.from_user.id, available_ids)
+            auto = await storage.set_target_chats(call.from_user.id, available_ids)
             update_message = "Все доступные чаты добавлены в рассылку."
     else:
         if len(action_parts) < 3:
@@ -1035,7 +1362,7 @@ async def cb_group_toggle(call: types.CallbackQuery) -> None:
             await call.answer("Чат не найден. Обновите список.", show_alert=True)
             return
         if not chat_info.get("delivery_available"):
-            await refresh_user_delivery_chats()
+            await refresh_user_delivery_chats_if_stale()
             known = await storage.list_known_chats()
             chat_info = known.get(str(chat_id))
             if not chat_info or not chat_info.get("delivery_available"):
@@ -1046,45 +1373,42 @@ async def cb_group_toggle(call: types.CallbackQuery) -> None:
                 )
                 return
         title_raw = chat_info.get("title") or str(chat_id)
-        title = quote_html(title_raw)
-        selected = await storage.toggle_target_chat(call.from_user.id, chat_id, title_raw)
+        title = escape_html(title_raw)
+        # The chat is already known; re-sending its title would only invalidate the known-chats cache.
+        selected, known, auto = await storage.toggle_and_snapshot(call.from_user.id, chat_id)
         update_message = f"Чат {'добавлен в' if selected else 'убран из'} рассылки: {title}"
-    await storage.ensure_constraints(call.from_user.id)
-    auto_sender_instance: AutoSender = call.bot["auto_sender"]
-    await auto_sender_instance.refresh(owner_id=call.from_user.id)
-    known = await storage.list_known_chats()
-    auto = await storage.get_auto(call.from_user.id)
+    auto_sender.schedule_refresh(call.from_user.id)
     reply_text = (
         "📋 <b>Выбор групп для рассылки</b>\n\n"
         f"{update_message}\n"
         "При необходимости выберите другие чаты или нажмите 'Готово'."
     )
-    await safe_edit_text(
+    schedule_edit_text(
         call.message,
         reply_text,
         reply_markup=groups_keyboard(known, auto.get("target_chat_ids"), origin=origin, page=page),
     )
 
 
-@dp.callback_query_handler(lambda c: c.data.startswith("manual_payment:"))
-async def cb_manual_payment_decision(call: types.CallbackQuery) -> None:
+async def cb_manual_payment_decision(call: types.CallbackQuery, state: FSMContext) -> None:
     if not await is_admin_user(call.from_user.id):
         await call.answer("Недостаточно прав.", show_alert=True)
         return
-    try:
-        _, action, user_id_raw = call.data.split(":", maxsplit=2)
-        user_id = int(user_id_raw)
-    except (ValueError, TypeError):
+    args = callback_args(call.data)
+    if args is None or not args[1].isdecimal():
         await call.answer("Некорректные данные.", show_alert=True)
         return
-    if action not in {"approve", "decline"}:
+    action, user_id_raw = args
+    user_id = int(user_id_raw)
+    status = PAYMENT_ACTION_STATUSES.get(action)
+    if status is None:
         await call.answer("Неизвестное действие.", show_alert=True)
         return
-    last_payment = await storage.get_latest_payment_for_user(user_id)
-    username = (last_payment or {}).get("username")
-    full_name = (last_payment or {}).get("full_name") or (username and f"@{username}") or f"Пользователь {user_id}"
-    card_number = (last_payment or {}).get("card_number") or "manual-check"
-    card_name = (last_payment or {}).get("card_name") or "Перепроверка"
+    get_previous = (await storage.get_latest_payment_for_user(user_id) or {}).get
+    username = get_previous("username")
+    full_name = get_previous("full_name") or (username and f"@{username}") or f"Пользователь {user_id}"
+    card_number = get_previous("card_number") or "manual-check"
+    card_name = get_previous("card_name") or "Перепроверка"
     request_id = await storage.create_payment_request(
         user_id=user_id,
         username=username,
@@ -1094,92 +1418,81 @@ async def cb_manual_payment_decision(call: types.CallbackQuery) -> None:
     )
     updated = await storage.set_payment_status(
         request_id,
-        status="approved" if action == "approve" else "declined",
+        status=status,
         admin_id=call.from_user.id,
         admin_username=call.from_user.username,
     )
+    invalidate_payment_caches()
     if not updated:
         await call.answer("Не удалось обновить заявку.", show_alert=True)
         return
     status_message = build_user_payment_status_message(updated.get("status"), updated.get("resolved_at"))
     user_id = updated.get("user_id")
-    await send_payment_status_to_user(user_id, status_message)
     admin_text = build_payment_admin_text(updated)
-    await safe_edit_text(call.message, "Перепроверка завершена:\n\n" + admin_text)
-    auto_sender: Optional[AutoSender] = call.bot.get("auto_sender")
+    await asyncio.gather(
+        send_payment_status_to_user(user_id, status_message),
+        safe_edit_text(call.message, "Перепроверка завершена:\n\n" + admin_text),
+    )
     if auto_sender and user_id:
-        await auto_sender.refresh(owner_id=user_id)
+        auto_sender.schedule_refresh(user_id)
     await call.answer("Решение сохранено.")
 
 
-@dp.callback_query_handler(lambda c: c.data.startswith("payment:"))
-async def cb_payment_decision(call: types.CallbackQuery) -> None:
+async def cb_payment_decision(call: types.CallbackQuery, state: FSMContext) -> None:
     if not await is_admin_user(call.from_user.id):
         await call.answer("Недостаточно прав.", show_alert=True)
         return
-    try:
-        _, action, request_id = call.data.split(":", maxsplit=2)
-    except ValueError:
+    args = callback_args(call.data)
+    if args is None:
         await call.answer("Неверный формат данных.", show_alert=True)
         return
-    payment = await storage.get_payment(request_id)
-    if not payment:
-        await call.answer("Заявка не найдена.", show_alert=True)
-        return
-    if payment.get("status") != "pending":
-        await call.answer("Заявка уже обработана.", show_alert=True)
-        return
-    if action not in {"approve", "decline"}:
+    action, request_id = args
+    status = PAYMENT_ACTION_STATUSES.get(action)
+    if status is None:
         await call.answer("Неизвестное действие.", show_alert=True)
         return
-    status = "approved" if action == "approve" else "declined"
+    # The status check and the update are one statement, so two admins cannot both resolve it.
     updated = await storage.set_payment_status(
         request_id,
         status=status,
         admin_id=call.from_user.id,
         admin_username=call.from_user.username,
+        expected_status="pending",
     )
     if not updated:
-        await call.answer("Не удалось обновить заявку.", show_alert=True)
+        await call.answer("Заявка не найдена или уже обработана.", show_alert=True)
         return
+    invalidate_payment_caches()
     status_message = build_user_payment_status_message(status, updated.get("resolved_at"))
     user_id = updated.get("user_id")
-    await send_payment_status_to_user(user_id, status_message)
     admin_text = build_payment_admin_text(updated)
-    await safe_edit_text(call.message, admin_text)
+    await asyncio.gather(
+        send_payment_status_to_user(user_id, status_message),
+        safe_edit_text(call.message, admin_text),
+    )
     await call.answer("Решение сохранено.")
 
 
-@dp.callback_query_handler(lambda c: c.data == "main:payments_pdf")
-async def cb_main_payments_pdf(call: types.CallbackQuery) -> None:
+async def cb_main_payments_pdf(call: types.CallbackQuery, state: FSMContext) -> None:
     if not await is_admin_user(call.from_user.id):
         await call.answer("Доступно только администраторам.", show_alert=True)
         return
-    await call.answer()
+    acknowledge(call)
     payments = await storage.get_all_payments()
     if not payments:
         await call.message.answer("Пока нет заявок на оплату.")
         return
     timestamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
-    pdf_path = BASE_DIR / "data" / f"payments_{timestamp}.pdf"
-    loop = asyncio.get_running_loop()
-    await loop.run_in_executor(None, build_payments_pdf, payments, pdf_path)
-    try:
-        await call.message.answer_document(
-            InputFile(str(pdf_path)),
-            caption="Отчёт по оплатам (PDF).",
-        )
-    finally:
-        try:
-            pdf_path.unlink()
-        except OSError:
-            pass
+    pdf_bytes = await render_payments_pdf_in_subprocess(payments)
+    await call.message.answer_document(
+        InputFile(io.BytesIO(pdf_bytes), filename=f"payments_{timestamp}.pdf"),
+        caption="Отчёт по оплатам (PDF).",
+    )
 
 
-@dp.callback_query_handler(lambda c: c.data == "auto:start")
-async def cb_auto_start(call: types.CallbackQuery) -> None:
-    await call.answer()
-    await refresh_user_delivery_chats()
+async def cb_auto_start(call: types.CallbackQuery, state: FSMContext) -> None:
+    acknowledge(call)
+    await refresh_user_delivery_chats_if_stale()
     auto = await storage.get_auto(call.from_user.id)
     if not auto.get("message"):
         await call.message.answer("Сначала задайте текст сообщения.")
@@ -1188,14 +1501,14 @@ async def cb_auto_start(call: types.CallbackQuery) -> None:
     if not selected_targets:
         await call.message.answer("Не выбрано ни одной группы для рассылки.")
         return
-    delivery_ready = await storage.list_delivery_ready_chat_ids()
-    missing_targets = [chat_id for chat_id in selected_targets if chat_id not in delivery_ready]
-    if missing_targets:
-        known = await storage.list_known_chats()
-        titles = [
-            (known.get(str(chat_id)) or {}).get("title") or str(chat_id)
-            for chat_id in missing_targets
-        ]
+    # The known-chats snapshot carries delivery_available too, so one read serves both checks.
+    known = await storage.list_known_chats()
+    titles = []
+    for chat_id in selected_targets:
+        info = known.get(str(chat_id)) or {}
+        if not info.get("delivery_available"):
+            titles.append(info.get("title") or str(chat_id))
+    if titles:
         agent_name = "пользователь рассылки" if USE_USER_DELIVERY else "бот"
         await call.message.answer(
             f"{agent_name.capitalize()} не добавлен в следующие группы:\n"
@@ -1217,33 +1530,26 @@ async def cb_auto_start(call: types.CallbackQuery) -> None:
             f"Для запуска авторассылки необходимо актуальное пополнение баланса за последние {PAYMENT_VALID_DAYS} дней."
         )
         return
-    await storage.set_auto_enabled(call.from_user.id, True)
-    auto_sender: AutoSender = call.bot["auto_sender"]
+    updated = await storage.set_auto_enabled(call.from_user.id, True)
     await auto_sender.ensure_running(call.from_user.id)
     await call.message.answer("Авторассылка запущена.")
-    updated = await storage.get_auto(call.from_user.id)
     await show_auto_menu(call.message, updated, user_id=call.from_user.id)
 
 
-@dp.callback_query_handler(lambda c: c.data == "auto:stop")
-async def cb_auto_stop(call: types.CallbackQuery) -> None:
-    await call.answer()
-    await storage.set_auto_enabled(call.from_user.id, False)
-    auto_sender: AutoSender = call.bot["auto_sender"]
+async def cb_auto_stop(call: types.CallbackQuery, state: FSMContext) -> None:
+    acknowledge(call)
+    updated = await storage.set_auto_enabled(call.from_user.id, False)
     await auto_sender.stop(owner_id=call.from_user.id)
     await call.message.answer("Авторассылка остановлена.")
-    updated = await storage.get_auto(call.from_user.id)
     await show_auto_menu(call.message, updated, user_id=call.from_user.id)
 
 
 @dp.message_handler(
     lambda message: message.chat.type == types.ChatType.PRIVATE and not (message.text or "").startswith("/"),
     content_types=types.ContentTypes.ANY,
-    state="*",
+    state=None,
 )
 async def handle_private_message_without_command(message: types.Message, state: FSMContext) -> None:
-    if await state.get_state():
-        return
     if not await is_admin_user(message.from_user.id):
         notified = await notify_admins_about_incoming_message(message)
         if notified:
@@ -1257,18 +1563,18 @@ async def handle_private_message_without_command(message: types.Message, state:
     await send_main_menu(message)
 
 
-@dp.callback_query_handler(lambda c: c.data.startswith("inbox:reply:"), state="*")
 async def cb_inbox_reply(call: types.CallbackQuery, state: FSMContext) -> None:
     if not await is_admin_user(call.from_user.id):
         await call.answer("Недостаточно прав.", show_alert=True)
         return
+    args = callback_args(call.data)
     try:
-        _, _, user_id_raw = call.data.split(":", maxsplit=2)
+        _, user_id_raw = args
         target_user_id = int(user_id_raw)
     except (ValueError, TypeError):
         await call.answer("Некорректные данные.", show_alert=True)
         return
-    await call.answer()
+    acknowledge(call)
     await state.finish()
     await AdminInboxStates.waiting_for_reply.set()
     await state.update_data(reply_target=target_user_id)
@@ -1278,6 +1584,56 @@ async def cb_inbox_reply(call: types.CallbackQuery, state: FSMContext) -> None:
     )
 
 
+CallbackHandler = Callable[[types.CallbackQuery, FSMContext], Awaitable[None]]
+
+# Exact callback_data values.
+CALLBACK_ROUTES: Dict[str, CallbackHandler] = {
+    "main:auto": cb_main_auto,
+    "main:stats": cb_main_stats,
+    "main:groups": cb_main_groups,
+    "main:settings": cb_main_settings,
+    "main:pay": cb_main_pay,
+    "main:user_payments": cb_main_user_payments,
+    "main:admin_payments": cb_main_admin_payments,
+    "main:manual_payment": cb_main_manual_payment,
+    "auto:back": cb_auto_back,
+    "auto:set_message": cb_auto_set_message,
+    "auto:set_interval": cb_auto_set_interval,
+    "auto:pick_groups": cb_auto_pick_groups,
+    "main:payments_pdf": cb_main_payments_pdf,
+    "auto:start": cb_auto_start,
+    "auto:stop": cb_auto_stop,
+}
+# Parameterised callback_data, keyed by "prefix:action" or, failing that, by "prefix".
+CALLBACK_PREFIX_ROUTES: Dict[str, CallbackHandler] = {
+    "group": cb_group_toggle,
+    "manual_payment": cb_manual_payment_decision,
+    "payment": cb_payment_decision,
+    # Runs in any FSM state, so it is keyed on the action and no other inbox payload reaches it.
+    "inbox:reply": cb_inbox_reply,
+}
+# Everything else keeps aiogram's default of only running outside an FSM state.
+ANY_STATE_CALLBACK_HANDLERS = frozenset({cb_inbox_reply})
+
+
+@dp.callback_query_handler(state="*")
+async def route_callback_query(call: types.CallbackQuery, state: FSMContext) -> None:
+    data = call.data or ""
+    handler = CALLBACK_ROUTES.get(data)
+    if handler is None:
+        route_prefix, separator, rest = data.partition(":")
+        if separator:
+            action = rest.partition(":")[0]
+            handler = CALLBACK_PREFIX_ROUTES.get(f"{route_prefix}:{action}")
+            if handler is None:
+                handler = CALLBACK_PREFIX_ROUTES.get(route_prefix)
+    if handler is None:
+        return
+    if handler not in ANY_STATE_CALLBACK_HANDLERS and await state.get_state() is not None:
+        return
+    await handler(call, state)
+
+
 @dp.message_handler(state=AdminInboxStates.waiting_for_reply, content_types=types.ContentTypes.ANY)
 async def handle_admin_reply(message: types.Message, state: FSMContext) -> None:
     data = await state.get_data()
@@ -1345,81 +1701,145 @@ async def apply_chat_membership_update(
             logger.info("Удалён чат %s", chat.id)
 
 
+ACTIVE_MEMBER_STATUSES = (
+    types.ChatMemberStatus.ADMINISTRATOR,
+    types.ChatMemberStatus.CREATOR,
+    types.ChatMemberStatus.MEMBER,
+)
+# chat_id -> bot is an active member. Checked once per chat per process; my_chat_member
+# updates keep it current afterwards, so group messages never need another API call.
+bot_membership_cache: Dict[int, bool] = {}
+
+
 @dp.my_chat_member_handler()
 async def handle_my_chat_member(update: types.ChatMemberUpdated) -> None:
-    await apply_chat_membership_update(update.chat, update.new_chat_member.status)
+    status = update.new_chat_member.status
+    bot_membership_cache[update.chat.id] = status in ACTIVE_MEMBER_STATUSES
+    await apply_chat_membership_update(update.chat, status)
 
 
 @dp.message_handler(content_types=types.ContentTypes.TEXT, chat_type=[types.ChatType.GROUP, types.ChatType.SUPERGROUP])
 async def handle_group_text(message: types.Message) -> None:
     chat = message.chat
-    title_raw = chat.title or chat.full_name or str(chat.id)
-    bot_id = message.bot.get("bot_id")
-    if bot_id is None:
-        me = await message.bot.get_me()
-        bot_id = me.id
-        message.bot["bot_id"] = bot_id
+    if chat.id in bot_membership_cache:
+        # The chat was already recorded when this entry was cached.
+        return
     member = await message.bot.get_chat_member(chat.id, bot_id)
-    if member.status in (
-        types.ChatMemberStatus.ADMINISTRATOR,
-        types.ChatMemberStatus.CREATOR,
-        types.ChatMemberStatus.MEMBER,
-    ):
+    is_member = member.status in ACTIVE_MEMBER_STATUSES
+    bot_membership_cache[chat.id] = is_member
+    if is_member:
         await ensure_known_group_chat(chat)
 
 
+# Webhook mode is used when WEBHOOK_URL (the public https base URL) is set; otherwise long polling.
+WEBHOOK_URL = (os.getenv("WEBHOOK_URL") or "").rstrip("/")
+# Telegram echoes this token in every webhook request; anything without it is rejected.
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET") or ""
+if WEBHOOK_URL and not re.fullmatch(r"[A-Za-z0-9_-]{1,256}", WEBHOOK_SECRET):
+    raise RuntimeError("WEBHOOK_SECRET (1-256 chars: A-Z, a-z, 0-9, _ and -) is required when WEBHOOK_URL is set.")
+# Without an explicit path the endpoint is derived from the secret, so it is not guessable.
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH") or f"/webhook/{hashlib.sha256(WEBHOOK_SECRET.encode()).hexdigest()[:32]}"
+WEBHOOK_CHECK_IP = os.getenv("WEBHOOK_CHECK_IP", "false").lower() in {"1", "true", "yes"}
+WEBAPP_HOST = os.getenv("WEBAPP_HOST", "0.0.0.0")
+WEBAPP_PORT = int(os.getenv("PORT", "8080"))
+
+
+class SecretTokenRequestHandler(WebhookRequestHandler):
+    """aiogram 2 never reads X-Telegram-Bot-Api-Secret-Token, so the check is done here."""
+
+    async def post(self) -> web.Response:
+        received = self.request.headers.get("X-Telegram-Bot-Api-Secret-Token", "")
+        if not hmac.compare_digest(received.encode(), WEBHOOK_SECRET.encode()):
+            logger.warning("Отклонён запрос к webhook без верного секретного токена.")
+            raise web.HTTPUnauthorized()
+        return await super().post()
+
+
 async def on_startup(dispatcher: Dispatcher) -> None:
-    me = await dispatcher.bot.get_me()
+    global auto_sender, bot_id, delivery_chats_refresher
     mtproto_delivery: Optional[UserDelivery] = dispatcher.bot.get("user_delivery")
 
     async def send_via_bot(chat_id: int, text: str) -> None:
         await dispatcher.bot.send_message(chat_id, text)
 
+    async def start_user_delivery(delivery: UserDelivery) -> None:
+        await delivery.start()
+        await delivery.sync_known_chats(storage)
+
+    # Bot API, MTProto and database warm-up do not depend on each other.
+    async with asyncio.TaskGroup() as startup_group:
+        me_task = startup_group.create_task(dispatcher.bot.get_me())
+        startup_group.create_task(storage.ensure_constraints())
+        startup_group.create_task(load_dynamic_admin_ids())
+        if WEBHOOK_URL:
+            startup_group.create_task(
+                dispatcher.bot.set_webhook(WEBHOOK_URL + WEBHOOK_PATH, secret_token=WEBHOOK_SECRET)
+            )
+        if mtproto_delivery:
+            startup_group.create_task(start_user_delivery(mtproto_delivery))
+    me = me_task.result()
+
     send_callable: Callable[[int, str], Awaitable[None]] = send_via_bot
+    send_limiter: Optional[RateLimiter] = bot_send_limiter
     if mtproto_delivery:
-        await mtproto_delivery.start()
-        await mtproto_delivery.sync_known_chats(storage)
         send_callable = mtproto_delivery.send_text
+        send_limiter = None
     auto_sender = AutoSender(
         send_callable,
         storage,
         PAYMENT_VALID_DAYS,
+        rate_limiter=send_limiter,
     )
-    dispatcher.bot["auto_sender"] = auto_sender
-    dispatcher.bot["bot_id"] = me.id
-    await storage.ensure_constraints()
+    bot_id = me.id
     if not mtproto_delivery:
         await storage.mark_all_chats_delivery_available()
     await auto_sender.start_if_enabled()
+    if mtproto_delivery:
+        delivery_chats_refresher = asyncio.create_task(refresh_delivery_chats_periodically())
     logger.info("Бот %s (%s) запущен", me.first_name, me.id)
 
 
 async def on_shutdown(dispatcher: Dispatcher) -> None:
-    auto_sender: Optional[AutoSender] = dispatcher.bot.get("auto_sender")
+    if delivery_chats_refresher:
+        delivery_chats_refresher.cancel()
     if auto_sender:
         await auto_sender.stop()
     mtproto_delivery: Optional[UserDelivery] = dispatcher.bot.get("user_delivery")
     if mtproto_delivery:
         await mtproto_delivery.stop()
+    if background_tasks:
+        await asyncio.gather(*background_tasks, return_exceptions=True)
     await dispatcher.storage.close()
     await dispatcher.storage.wait_closed()
 
 
 if __name__ == "__main__":
-    retry_delay_raw = os.getenv("POLLING_RETRY_DELAY", "5")
-    try:
-        retry_delay = int(retry_delay_raw)
-    except ValueError:
-        retry_delay = 5
-    retry_delay = max(1, retry_delay)
-    while True:
+    if WEBHOOK_URL:
+        # The module-level executor.start_webhook cannot take a custom request handler.
+        webhook_executor = executor.Executor(dp, skip_updates=False, check_ip=WEBHOOK_CHECK_IP)
+        webhook_executor.on_startup(on_startup)
+        webhook_executor.on_shutdown(on_shutdown)
+        webhook_executor.start_webhook(
+            webhook_path=WEBHOOK_PATH,
+            request_handler=SecretTokenRequestHandler,
+            host=WEBAPP_HOST,
+            port=WEBAPP_PORT,
+        )
+    else:
+        retry_delay_raw = os.getenv("POLLING_RETRY_DELAY", "5")
         try:
-            executor.start_polling(dp, skip_updates=False, on_startup=on_startup, on_shutdown=on_shutdown)
-            break
-        except exceptions.TerminatedByOtherGetUpdates:
-            logger.warning(
-                "Получен сигнал о другом активном getUpdates. Ждём %s c и пробуем снова.",
-                retry_delay,
-            )
-            # Два инстанса могут короткое время пересекаться при деплое, поэтому просто ждём и пробуем ещё раз.
-            asyncio.run(asyncio.sleep(retry_delay))
+            retry_delay = int(retry_delay_raw)
+        except ValueError:
+            retry_delay = 5
+        retry_delay = max(1, retry_delay)
+        while True:
+            try:
+                executor.start_polling(dp, skip_updates=False, on_startup=on_startup, on_shutdown=on_shutdown)
+                break
+            except exceptions.TerminatedByOtherGetUpdates:
+                logger.warning(
+                    "Получен сигнал о другом активном getUpdates. Ждём %s c и пробуем снова.",
+                    retry_delay,
+                )
+                # Два инстанса могут короткое время пересекаться при деплое, поэтому просто ждём и пробуем ещё раз.
+                time.sleep(retry_delay)
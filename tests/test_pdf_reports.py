@@ -0,0 +1,36 @@
+import asyncio
+import pickle
+import subprocess
+
+import pytest
+
+pytest.importorskip("fpdf")
+
+from app import pdf_reports  # noqa: E402
+
+PAYMENT = {
+    "request_id": "r1",
+    "user_id": 1,
+    "full_name": "Тест",
+    "status": "pending",
+    "created_at": "2024-01-01T00:00:00",
+}
+
+
+def test_render_in_subprocess_returns_pdf() -> None:
+    data = asyncio.run(pdf_reports.render_payments_pdf_in_subprocess([PAYMENT]))
+    assert data.startswith(b"%PDF-")
+
+
+def test_render_worker_does_not_import_bot() -> None:
+    command = [pdf_reports.RENDER_COMMAND[0], "-X", "importtime", *pdf_reports.RENDER_COMMAND[1:]]
+    result = subprocess.run(
+        command,
+        input=pickle.dumps([PAYMENT]),
+        capture_output=True,
+        cwd=pdf_reports._PROJECT_DIR,
+        check=True,
+    )
+    imported = {line.rsplit("|", 1)[-1].strip() for line in result.stderr.decode().splitlines()}
+    assert not {"bot", "__mp_main__", "app.storage", "aiogram"} & imported
+    assert result.stdout.startswith(b"%PDF-")
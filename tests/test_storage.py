@@ -0,0 +1,47 @@
+import asyncio
+import sqlite3
+from pathlib import Path
+
+from app.storage import Storage
+
+
+def test_lost_payment_race_releases_the_write_lock(tmp_path: Path) -> None:
+    db_path = tmp_path / "storage.db"
+
+    async def scenario() -> None:
+        storage = Storage(db_path)
+        request_id = await storage.create_payment_request(
+            user_id=1,
+            username=None,
+            full_name="Test",
+            card_number="4000000000000000",
+            card_name="TEST",
+        )
+        decide = dict(status="approved", admin_id=2, admin_username=None, expected_status="pending")
+        assert await storage.set_payment_status(request_id, **decide) is not None
+        assert await storage.set_payment_status(request_id, **decide) is None
+
+        other = sqlite3.connect(db_path, timeout=0)
+        try:
+            other.execute("UPDATE payments SET card_name = ? WHERE request_id = ?", ("OTHER", request_id))
+            other.commit()
+        finally:
+            other.close()
+
+    asyncio.run(scenario())
+
+
+def test_setters_return_the_campaign_after_constraints(tmp_path: Path) -> None:
+    async def scenario() -> None:
+        storage = Storage(tmp_path / "storage.db")
+        await storage.bulk_upsert_known_chats([(-100, "Group")])
+        await storage.set_auto_message(1, "Hello")
+        await storage.set_auto_interval(1, 5)
+        await storage.set_target_chats(1, [-100])
+        assert (await storage.set_auto_enabled(1, True))["is_enabled"]
+
+        selected, _, campaign = await storage.toggle_and_snapshot(1, -100)
+        assert not selected
+        assert not campaign["is_enabled"]
+
+    asyncio.run(scenario())